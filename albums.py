@@ -0,0 +1,51 @@
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+from aiogram.types import Message
+
+
+class _Album:
+    __slots__ = ("messages", "updated")
+
+    def __init__(self, message: Message):
+        self.messages = [message]
+        self.updated = time.monotonic()
+
+
+class AlbumCollector:
+    """Сборка альбома (фото с общим media_group_id) из отдельных сообщений.
+
+    Telegram присылает каждое фото альбома отдельным обновлением. Первое
+    сообщение ждёт, пока `window` секунд не придёт ни одного нового, и
+    возвращает весь альбом; остальные сообщения только добавляются к нему.
+    Обновления обрабатываются параллельно, поэтому ожидание первого не
+    задерживает остальные.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._albums: Dict[Tuple[int, str], _Album] = {}
+
+    async def collect(self, message: Message) -> Optional[List[Message]]:
+        """Все сообщения альбома в порядке отправки или None, если альбом вернёт другой вызов"""
+        if message.media_group_id is None:
+            return [message]
+
+        key = (message.chat.id, message.media_group_id)
+        album = self._albums.get(key)
+        if album is not None:
+            album.messages.append(message)
+            album.updated = time.monotonic()
+            return None
+
+        album = self._albums[key] = _Album(message)
+        try:
+            while True:
+                delay = album.updated + self.window - time.monotonic()
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+        finally:
+            del self._albums[key]
+
+        return sorted(album.messages, key=lambda m: m.message_id)
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Tuple
+from aiogram import Bot
+import database as db
+from cold_storage import ColdArchive
+from config import ARCHIVE_AFTER_DAYS
+from migrations import SCHEMA_VERSION
+from models import Group
+from pagination import invalidate as invalidate_pages
+from scheduler import job_handler, scheduler
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SWEEP = "archive"
+# Как часто искать группы для архивации, сек
+SWEEP_INTERVAL = 6 * 3600
+
+
+def pack_group(archive: ColdArchive, group: Group, qr_paths: List[str]):
+    """Запись группы и её QR-кодов в архив (выполняется в отдельном потоке)"""
+    payload = {"schema_version": SCHEMA_VERSION, **group.to_dict()}
+    archive.write_bundle(group.invite_code, json.dumps(payload, ensure_ascii=False), qr_paths)
+
+
+async def archive_inactive_groups(max_idle: float) -> List[str]:
+    """Перенос неактивных распределённых групп в холодный архив. Возвращает коды перенесённых"""
+    archive = db.get_archive()
+
+    # Группы, восстановленные из архива, уже записаны в рабочую базу — архивная копия не нужна
+    await db.wait_durable()
+    hot_groups = db.load_db()["groups"]
+    for invite_code in archive.codes():
+        if invite_code in hot_groups:
+            archive.discard(invite_code)
+
+    # Код группы → (версия на момент упаковки, пути QR-кодов)
+    packed: Dict[str, Tuple[int, List[str]]] = {}
+    summaries: Dict[str, Dict] = {}
+    for invite_code in db.find_inactive_groups(max_idle):
+        group = db.get_group(invite_code)
+        if group is None:
+            continue
+
+        # Группа в снимке не меняется, поэтому сериализация и упаковка идут в отдельном потоке
+        qr_paths = group.qr_code_paths()
+        try:
+            await asyncio.to_thread(pack_group, archive, group, qr_paths)
+        except Exception as e:
+            logger.error("Не удалось заархивировать группу %s: %s", invite_code, e)
+            continue
+
+        packed[invite_code] = (group.version, qr_paths)
+        summaries[invite_code] = {
+            "name": group.name,
+            "admin_id": group.admin_id,
+            "participants_count": len(group.participants),
+            "members": [str(user_id) for user_id in group.participants],
+            "archived_at": time.time()
+        }
+
+    # Группы, удалённые во время упаковки: их discard ничего не нашёл в индексе,
+    # поэтому убираем архивную копию сами, иначе группа вернётся из архива
+    for invite_code in list(packed):
+        if db.peek_group(invite_code) is None:
+            archive.drop_bundle(invite_code)
+            del packed[invite_code]
+            del summaries[invite_code]
+
+    if not packed:
+        return []
+
+    # Индекс пишется до удаления из рабочей базы, чтобы группа всегда была хотя бы в одном месте
+    archive.add(summaries)
+
+    # Группы, изменённые во время упаковки, остаются в рабочей базе,
+    # а их архивная копия удалится при следующем обходе
+    archived = [
+        invite_code for invite_code, (version, _) in packed.items()
+        if db.remove_archived_group(invite_code, version)
+    ]
+
+    # QR-коды удаляются, только когда база без этих групп уже на диске
+    await db.wait_durable()
+    for invite_code in archived:
+        invalidate_pages(invite_code)
+        for path in packed[invite_code][1]:
+            db.delete_qr_code_file(path)
+
+    logger.info("В архив перенесено групп: %s", len(archived))
+    return archived
+
+
+@job_handler(ARCHIVE_SWEEP)
+async def run_archive_sweep(bot: Bot, job: Dict):
+    """Периодический обход групп для архивации"""
+    try:
+        await archive_inactive_groups(ARCHIVE_AFTER_DAYS * 86400)
+    finally:
+        scheduler.schedule(ARCHIVE_SWEEP, "", time.time() + SWEEP_INTERVAL)
+
+
+def schedule_archive_sweep():
+    """Планирование обхода, если архивация включена и обход ещё не запланирован"""
+    if ARCHIVE_AFTER_DAYS <= 0:
+        scheduler.cancel(ARCHIVE_SWEEP, "")
+        return
+
+    if scheduler.get(ARCHIVE_SWEEP, "") is None:
+        scheduler.schedule(ARCHIVE_SWEEP, "", time.time())
@@ -2,47 +2,125 @@ import asyncio
 import logging
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
-from config import BOT_TOKEN
-from handlers import start, groups, santa, qr_codes
-import database as db
-
-# Logging setup
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from config import (
+    BOT_TOKEN, THROTTLE_RATE, THROTTLE_BURST, DB_FLUSH_INTERVAL, DB_FLUSH_MAX_LATENCY,
+    LOG_LEVEL, LOG_FORMAT, LOG_ERROR_BURST, LOG_ERROR_WINDOW, TRACE_SAMPLE_RATE, TRACE_FILE,
+    BOT_RATE_LIMIT, BOT_CHAT_RATE, BOT_CHAT_BURST, BOT_BULK_SHARE, BOT_POOL_SIZE, BOT_KEEPALIVE,
+    UPDATES_FILE, DEDUP_WINDOW
+)
+from handlers import start, groups, santa, qr_codes, admin, deadlines, relay
+import callbacks
+from middlewares import (
+    ThrottlingMiddleware, UpdateContextMiddleware, HandlerContextMiddleware,
+    TracingMiddleware, TracingRequestMiddleware, DeduplicationMiddleware
 )
+import database as db
+from bot_session import RateLimiter, ThrottledSession
+from outbox import outbox
+from notifications import wishlist_notifier
+from scheduler import scheduler
+from archive import schedule_archive_sweep
+from logs import setup_logging, stop_logging
+import tracing
 
 logger = logging.getLogger(__name__)
 
 
-async def main():
-    """Main function to start the bot"""
+def create_session(**kwargs) -> ThrottledSession:
+    """Create the Bot API session with a keep-alive pool and a shared rate limiter"""
+    limiter = None
+    if BOT_RATE_LIMIT > 0:
+        limiter = RateLimiter(BOT_RATE_LIMIT, BOT_CHAT_RATE, BOT_CHAT_BURST, BOT_BULK_SHARE)
+    return ThrottledSession(limiter=limiter, limit=BOT_POOL_SIZE, keepalive_timeout=BOT_KEEPALIVE, **kwargs)
 
-    # Initialize database
-    db.init_db()
 
-    # Initialize bot and dispatcher
-    bot = Bot(token=BOT_TOKEN)
+def create_dispatcher() -> Dispatcher:
+    """Create the dispatcher with all middlewares and routers"""
     storage = MemoryStorage()
     dp = Dispatcher(storage=storage)
 
+    # Updates Telegram delivers twice (e.g. after a restart) are dropped before anything else sees them
+    dp.update.outer_middleware(DeduplicationMiddleware(DEDUP_WINDOW, UPDATES_FILE))
+
+    # The tracing middleware goes next so the update span covers everything below it
+    dp.update.outer_middleware(TracingMiddleware())
+
+    # Tag every log record with the update, user, handler and group it belongs to
+    dp.update.outer_middleware(UpdateContextMiddleware())
+    dp.message.middleware(HandlerContextMiddleware())
+    dp.callback_query.middleware(HandlerContextMiddleware())
+
+    # Drop button spam before it reaches handlers and storage
+    dp.callback_query.outer_middleware(ThrottlingMiddleware(rate=THROTTLE_RATE, burst=THROTTLE_BURST))
+
     # Register routers (order matters!)
     dp.include_router(start.router)
     dp.include_router(groups.router)
     dp.include_router(santa.router)
     dp.include_router(qr_codes.router)
+    dp.include_router(admin.router)
+    dp.include_router(deadlines.router)
+    dp.include_router(relay.router)
 
-    # Start bot
-    logger.info("Secret Santa bot started!")
+    # Inline buttons are routed through a single prefix lookup table
+    dp.include_router(callbacks.router)
+
+    return dp
+
+
+async def run(bot: Bot, dp: Dispatcher, **polling_kwargs):
+    """Start background services and poll for updates until stopped"""
+
+    # Sampled updates get a trace with child spans for storage and Bot API calls
+    tracing.configure(TRACE_SAMPLE_RATE, TRACE_FILE)
+    bot.session.middleware(TracingRequestMiddleware())
+
+    # Coalesce storage writes into periodic atomic flushes
+    db.start_write_behind(DB_FLUSH_INTERVAL, DB_FLUSH_MAX_LATENCY)
+
+    # Background notifications are sent through a rate-limited queue
+    outbox.start(bot)
+
+    # Scheduled distributions and reminders survive restarts via the job journal
+    scheduler.start(bot)
+
+    # Finished groups that went quiet are moved to the cold archive
+    schedule_archive_sweep()
 
     try:
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types(), **polling_kwargs)
     finally:
+        await scheduler.stop()
+        wishlist_notifier.cancel_all()
+        await outbox.stop()
+        await db.stop_write_behind()
         await bot.session.close()
+        tracing.stop()
+
+
+async def main():
+    """Main function to start the bot"""
+
+    # Initialize database and bring it to the current schema before any handler reads it
+    db.init_db()
+    db.load_db()
+
+    # Initialize bot and dispatcher; every API call goes through the shared rate limiter
+    bot = Bot(token=BOT_TOKEN, session=create_session())
+    dp = create_dispatcher()
+
+    # Start bot
+    logger.info("Secret Santa bot started!")
+
+    await run(bot, dp)
 
 
 if __name__ == "__main__":
+    # Handlers only enqueue log records; a background thread writes them out
+    setup_logging(LOG_LEVEL, LOG_FORMAT, LOG_ERROR_BURST, LOG_ERROR_WINDOW)
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Bot stopped")
+    finally:
+        stop_logging()
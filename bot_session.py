@@ -0,0 +1,206 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple, Union
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты запросов: ответы пользователям идут раньше фоновых рассылок
+INTERACTIVE = 0
+BULK = 1
+
+# Лимит Telegram для групповых чатов: 20 сообщений в минуту
+GROUP_CHAT_RATE = 20 / 60
+
+# Сколько раз повторять запрос после 429 и сколько готов ждать пользователь
+MAX_RETRIES = 3
+INTERACTIVE_MAX_WAIT = 10.0
+
+ChatId = Union[int, str]
+
+_priority: ContextVar[int] = ContextVar("api_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def bulk() -> Iterator[None]:
+    """Запросы внутри блока считаются фоновой рассылкой и уступают ответам пользователям"""
+    token = _priority.set(BULK)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Корзина токенов; запас может уйти в минус — это очередь уже обещанных запросов"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated", "paused_until")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: float) -> float:
+        """Резерв одного токена. Возвращает, сколько секунд ждать до отправки"""
+        self.refill(now)
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.paused_until - now)
+
+
+class RateLimiter:
+    """Общий лимит запросов бота и лимит на каждый чат.
+
+    Общий лимит раздаётся по приоритету: ожидающие ответы пользователям
+    обслуживаются раньше рассылок. Рассылки к тому же не могут занять
+    последнюю `1 - bulk_share` часть запаса токенов, поэтому всплеск
+    нажатий не ждёт, пока отправятся сотни уведомлений.
+    """
+
+    def __init__(self, rate: float, chat_rate: float, chat_burst: int, bulk_share: float, max_chats: int = 10000):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_chats = max_chats
+        self._global = TokenBucket(rate, rate)
+        self._bulk_reserve = rate * (1 - bulk_share)
+        self._bulk_paused_until = 0.0
+        self._chats: "OrderedDict[ChatId, TokenBucket]" = OrderedDict()
+        # (приоритет, порядковый номер, future) ожидающих общего токена
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _chat_bucket(self, chat_id: ChatId) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Отрицательные ID — группы и каналы, у них лимит строже
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            rate = min(self.chat_rate, GROUP_CHAT_RATE) if is_group else self.chat_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, self.chat_burst)
+            if len(self._chats) > self.max_chats:
+                # Вытесняется давно неактивный чат: его корзина и так полная
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def acquire(self, chat_id: ChatId, priority: int):
+        """Ожидание разрешения на запрос в чат"""
+        delay = self._chat_bucket(chat_id).reserve(time.monotonic())
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        # Без очереди проходит только запрос, перед которым нет ожидающих того же или более высокого приоритета
+        if (not self._waiters or self._waiters[0][0] > priority) and self._try_take(priority, time.monotonic()):
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._schedule()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Токен уже выдан, но не использован
+                self._global.tokens += 1
+            raise
+
+    def pause(self, chat_id: ChatId, retry_after: float):
+        """Пауза после ответа 429: для чата и для всех рассылок"""
+        until = time.monotonic() + retry_after
+        bucket = self._chat_bucket(chat_id)
+        bucket.paused_until = max(bucket.paused_until, until)
+        self._bulk_paused_until = max(self._bulk_paused_until, until)
+
+    def _try_take(self, priority: int, now: float) -> bool:
+        if self._wait_time(priority, now) > 0:
+            return False
+        self._global.tokens -= 1
+        return True
+
+    def _wait_time(self, priority: int, now: float) -> float:
+        self._global.refill(now)
+        need = 1.0
+        paused = 0.0
+        if priority == BULK:
+            # При малом лимите резерв не помещается в корзину: тогда массовый ждёт полную корзину
+            need = min(need + self._bulk_reserve, self._global.burst)
+            paused = self._bulk_paused_until - now
+        return max(paused, (need - self._global.tokens) / self._global.rate, 0.0)
+
+    def _schedule(self):
+        """Таймер на момент, когда первый в очереди сможет получить токен"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._waiters:
+            delay = self._wait_time(self._waiters[0][0], time.monotonic())
+            self._timer = asyncio.get_running_loop().call_later(delay, self._release)
+
+    def _release(self):
+        self._timer = None
+        now = time.monotonic()
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._try_take(priority, now):
+                break
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+        self._schedule()
+
+
+class ThrottledSession(AiohttpSession):
+    """Сессия Bot API с настроенным пулом соединений и общим ограничением скорости.
+
+    Запросы, адресованные чату (отправка и правка сообщений, фото), проходят
+    через `RateLimiter`; служебные (getUpdates, getFile, answerCallbackQuery)
+    отправляются сразу. Ответ 429 обрабатывается здесь же: запрос
+    повторяется после указанной Telegram паузы.
+    """
+
+    def __init__(self, limiter: Optional[RateLimiter] = None, keepalive_timeout: float = 60.0, **kwargs):
+        super().__init__(**kwargs)
+        self.limiter = limiter
+        # Соединения с api.telegram.org переиспользуются, а не открываются на каждый запрос
+        self._connector_init["keepalive_timeout"] = keepalive_timeout
+
+    async def make_request(
+        self, bot: Bot, method: TelegramMethod[TelegramType], timeout: Optional[int] = None
+    ) -> TelegramType:
+        chat_id = getattr(method, "chat_id", None)
+        if self.limiter is None or chat_id is None:
+            return await super().make_request(bot, method, timeout)
+
+        priority = _priority.get()
+        for attempt in itertools.count(1):
+            await self.limiter.acquire(chat_id, priority)
+            try:
+                return await super().make_request(bot, method, timeout)
+            except TelegramRetryAfter as e:
+                self.limiter.pause(chat_id, e.retry_after)
+                if attempt > MAX_RETRIES or (priority == INTERACTIVE and e.retry_after > INTERACTIVE_MAX_WAIT):
+                    raise
+                logger.warning(
+                    "Bot API просит подождать %s с перед %s (чат %s)",
+                    e.retry_after, method.__api_method__, chat_id
+                )
@@ -0,0 +1,176 @@
+from typing import Callable, Dict, Tuple, Type
+from aiogram import Router
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery
+from logs import bind
+from singleflight import SingleFlight
+
+# Единая точка входа для всех inline-кнопок: обработчик ищется по префиксу
+# callback_data в таблице, а не перебором фильтров во всех роутерах.
+router = Router()
+
+_handlers: Dict[str, Tuple[Type[CallbackData], CallableObject, bool]] = {}
+
+# Действия, меняющие группу, выполняются по одному на (группа, действие)
+flights = SingleFlight()
+
+
+# Главное меню
+class MainMenuCallback(CallbackData, prefix="mm"):
+    pass
+
+
+class CreateGroupCallback(CallbackData, prefix="cg"):
+    pass
+
+
+class JoinGroupCallback(CallbackData, prefix="jg"):
+    pass
+
+
+class MyGroupsCallback(CallbackData, prefix="mg"):
+    pass
+
+
+# Действия с группой
+class GroupInfoCallback(CallbackData, prefix="gi"):
+    code: str
+
+
+class ParticipantsCallback(CallbackData, prefix="pl"):
+    code: str
+    page: int = 0
+
+
+class InviteLinkCallback(CallbackData, prefix="il"):
+    code: str
+
+
+class WishlistCallback(CallbackData, prefix="sw"):
+    code: str
+
+
+class DeleteGroupCallback(CallbackData, prefix="dg"):
+    code: str
+
+
+class ConfirmDeleteCallback(CallbackData, prefix="dx"):
+    code: str
+
+
+class ExportCallback(CallbackData, prefix="ex"):
+    code: str
+    fmt: str
+
+
+class ImportCallback(CallbackData, prefix="im"):
+    code: str
+
+
+class GroupStatsCallback(CallbackData, prefix="st"):
+    code: str
+
+
+# Распределение
+class StartDistributionCallback(CallbackData, prefix="sd"):
+    code: str
+
+
+class ConfirmDistributionCallback(CallbackData, prefix="cd"):
+    code: str
+    roster: int
+
+
+class CancelDistributionCallback(CallbackData, prefix="xd"):
+    code: str
+
+
+class RetryNotificationsCallback(CallbackData, prefix="rn"):
+    code: str
+
+
+class MyRecipientCallback(CallbackData, prefix="mr"):
+    code: str
+
+
+# Расписание
+class DeadlinesCallback(CallbackData, prefix="dl"):
+    code: str
+
+
+class SetDeadlineCallback(CallbackData, prefix="ds"):
+    code: str
+    kind: str
+
+
+class CancelDeadlineCallback(CallbackData, prefix="dc"):
+    code: str
+    kind: str
+
+
+# QR-коды
+class UploadQRCallback(CallbackData, prefix="uq"):
+    code: str
+
+
+class ViewQRCallback(CallbackData, prefix="vq"):
+    code: str
+
+
+# Анонимная переписка
+class WriteSantaCallback(CallbackData, prefix="ws"):
+    code: str
+
+
+class WriteRecipientCallback(CallbackData, prefix="wr"):
+    code: str
+
+
+def handler(callback_type: Type[CallbackData], single_flight: bool = False) -> Callable:
+    """Регистрация обработчика для типа callback_data.
+
+    С `single_flight` повторные нажатия, пришедшие, пока действие для той же
+    группы ещё выполняется, не запускают его заново, а дожидаются первого.
+    """
+    prefix = callback_type.__prefix__
+
+    def decorator(func: Callable) -> Callable:
+        if prefix in _handlers:
+            raise ValueError(f"Обработчик для префикса {prefix!r} уже зарегистрирован")
+        _handlers[prefix] = (callback_type, CallableObject(callback=func), single_flight)
+        return func
+
+    return decorator
+
+
+@router.callback_query()
+async def dispatch_callback(callback: CallbackQuery, **kwargs):
+    """Поиск обработчика по префиксу и вызов с разобранными данными"""
+    prefix = (callback.data or "").split(":", 1)[0]
+    entry = _handlers.get(prefix)
+
+    if entry is None:
+        await callback.answer("⚠️ Кнопка устарела. Откройте меню заново: /start", show_alert=True)
+        return
+
+    callback_type, callable_object, single_flight = entry
+
+    try:
+        callback_data = callback_type.unpack(callback.data)
+    except (TypeError, ValueError):
+        await callback.answer("⚠️ Кнопка устарела. Откройте меню заново: /start", show_alert=True)
+        return
+
+    bind(handler=callable_object.callback.__name__, invite_code=getattr(callback_data, "code", None))
+
+    kwargs["callback_data"] = callback_data
+    if not single_flight:
+        return await callable_object.call(callback, **kwargs)
+
+    key = (getattr(callback_data, "code", None), prefix)
+    result, shared = await flights.do(key, lambda: callable_object.call(callback, **kwargs))
+    if shared:
+        # Сообщение уже обновил первый обработчик; осталось погасить часики на кнопке
+        await callback.answer()
+    return result
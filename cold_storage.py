@@ -0,0 +1,187 @@
+import io
+import json
+import logging
+import os
+import tarfile
+import tempfile
+import time
+from typing import Dict, List, Optional
+from migrations import upgrade_group
+
+logger = logging.getLogger(__name__)
+
+GROUP_MEMBER = "group.json"
+FILES_PREFIX = "files/"
+
+
+def _replace_atomic(path: str, data: bytes):
+    """Атомарная запись двоичного файла: временный файл, fsync и переименование"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.")
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def qr_code_paths(group: Dict) -> List[str]:
+    """Пути ко всем QR-кодам группы"""
+    return [qr_code["path"] for assignment in group["assignments"].values() for qr_code in assignment["qr_codes"]]
+
+
+class ColdArchive:
+    """Холодное хранилище завершённых групп.
+
+    Каждая группа лежит в отдельном `<код>.tar.gz` вместе со своими QR-кодами.
+    В `index.json` хранится только краткая сводка (название, админ, участники),
+    чтобы архивные группы оставались в списке «Мои группы» без распаковки.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._index: Optional[Dict[str, Dict]] = None
+        # ID пользователя → коды его архивных групп
+        self._by_user: Dict[str, List[str]] = {}
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.directory, "index.json")
+
+    def bundle_path(self, invite_code: str) -> str:
+        return os.path.join(self.directory, f"{invite_code}.tar.gz")
+
+    # Индекс
+    def _load_index(self) -> Dict[str, Dict]:
+        if self._index is None:
+            self._index = {}
+            if os.path.exists(self.index_path):
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    self._index = json.load(f)["groups"]
+
+            self._by_user = {}
+            for invite_code, summary in self._index.items():
+                for user_id in summary["members"]:
+                    self._by_user.setdefault(user_id, []).append(invite_code)
+        return self._index
+
+    def _save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        payload = json.dumps({"groups": self._index}, ensure_ascii=False)
+        _replace_atomic(self.index_path, payload.encode("utf-8"))
+
+    def contains(self, invite_code: str) -> bool:
+        """Есть ли группа в архиве"""
+        return invite_code in self._load_index()
+
+    def user_groups(self, user_id: int) -> List[Dict]:
+        """Сводки архивных групп пользователя"""
+        index = self._load_index()
+        return [
+            {"invite_code": invite_code, **index[invite_code]}
+            for invite_code in self._by_user.get(str(user_id), [])
+        ]
+
+    # Упаковка и распаковка
+    def write_bundle(self, invite_code: str, payload: str, qr_paths: List[str]):
+        """Упаковка снимка группы и её QR-кодов. Не трогает индекс, можно вызывать из потока"""
+        os.makedirs(self.directory, exist_ok=True)
+
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+            data = payload.encode("utf-8")
+            info = tarfile.TarInfo(GROUP_MEMBER)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+
+            for path in qr_paths:
+                if os.path.exists(path):
+                    tar.add(path, arcname=FILES_PREFIX + os.path.basename(path))
+                else:
+                    logger.warning("QR-код %s группы %s не найден при архивации", path, invite_code)
+
+        _replace_atomic(self.bundle_path(invite_code), buffer.getvalue())
+
+    def add(self, summaries: Dict[str, Dict]):
+        """Добавление упакованных групп в индекс одной записью"""
+        index = self._load_index()
+        for invite_code, summary in summaries.items():
+            # Повторная архивация группы, восстановленной после прошлой
+            if invite_code in index:
+                self.discard(invite_code, keep_bundle=True)
+            index[invite_code] = summary
+            for user_id in summary["members"]:
+                self._by_user.setdefault(user_id, []).append(invite_code)
+        self._save_index()
+
+    def codes(self) -> List[str]:
+        """Коды всех архивных групп"""
+        return list(self._load_index())
+
+    def read(self, invite_code: str) -> Optional[Dict]:
+        """Группа из архива только для чтения: QR-коды не распаковываются"""
+        if not self.contains(invite_code):
+            return None
+
+        with tarfile.open(self.bundle_path(invite_code), mode="r:gz") as tar:
+            group = json.load(tar.extractfile(GROUP_MEMBER))
+        return upgrade_group(group, group.pop("schema_version", 0))
+
+    def restore(self, invite_code: str) -> Optional[Dict]:
+        """Распаковка группы: QR-коды возвращаются на прежние места.
+
+        Архивная копия не удаляется: её убирает `discard`, когда группа
+        уже надёжно записана в рабочую базу.
+        """
+        if not self.contains(invite_code):
+            return None
+
+        with tarfile.open(self.bundle_path(invite_code), mode="r:gz") as tar:
+            group = json.load(tar.extractfile(GROUP_MEMBER))
+            # Группа могла попасть в архив до последнего обновления схемы
+            group = upgrade_group(group, group.pop("schema_version", 0))
+            for path in qr_code_paths(group):
+                try:
+                    member = tar.extractfile(FILES_PREFIX + os.path.basename(path))
+                except KeyError:
+                    continue
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                _replace_atomic(path, member.read())
+
+        return group
+
+    def drop_bundle(self, invite_code: str):
+        """Удаление файла архива группы, ещё не попавшей в индекс"""
+        if os.path.exists(self.bundle_path(invite_code)):
+            os.remove(self.bundle_path(invite_code))
+
+    def discard(self, invite_code: str, keep_bundle: bool = False) -> bool:
+        """Удаление группы из архива"""
+        index = self._load_index()
+        summary = index.pop(invite_code, None)
+        if summary is None:
+            return False
+
+        for user_id in summary["members"]:
+            codes = self._by_user.get(user_id, [])
+            if invite_code in codes:
+                codes.remove(invite_code)
+            if not codes:
+                self._by_user.pop(user_id, None)
+
+        if keep_bundle:
+            return True
+
+        self._save_index()
+        if os.path.exists(self.bundle_path(invite_code)):
+            os.remove(self.bundle_path(invite_code))
+        return True
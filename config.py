@@ -9,3 +9,57 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN не найден в .env файле!")
+
+# Скорость отправки фоновых уведомлений (сообщений в секунду)
+OUTBOX_RATE = float(os.getenv("OUTBOX_RATE", "20"))
+
+# Ограничение запросов к Bot API: сообщений в секунду на весь бот (0 — без ограничения),
+# на один чат и запас для коротких всплесков в чате
+BOT_RATE_LIMIT = float(os.getenv("BOT_RATE_LIMIT", "30"))
+BOT_CHAT_RATE = float(os.getenv("BOT_CHAT_RATE", "1"))
+BOT_CHAT_BURST = int(os.getenv("BOT_CHAT_BURST", "3"))
+# Доля общего лимита, которую могут занять рассылки; остальное — запас для ответов пользователям
+BOT_BULK_SHARE = float(os.getenv("BOT_BULK_SHARE", "0.5"))
+# Пул соединений к Bot API и сколько секунд держать простаивающее соединение открытым
+BOT_POOL_SIZE = int(os.getenv("BOT_POOL_SIZE", "100"))
+BOT_KEEPALIVE = float(os.getenv("BOT_KEEPALIVE", "60"))
+
+# Ограничение частоты нажатий на кнопки: токенов в секунду и размер запаса
+THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", "2"))
+THROTTLE_BURST = int(os.getenv("THROTTLE_BURST", "5"))
+
+# Отложенная запись базы: пауза после последнего изменения и максимальная задержка, сек
+DB_FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", "0.05"))
+DB_FLUSH_MAX_LATENCY = float(os.getenv("DB_FLUSH_MAX_LATENCY", "1.0"))
+
+# Журнал обработанных обновлений и сколько последних update_id помнить, чтобы пропускать повторы
+UPDATES_FILE = os.getenv("UPDATES_FILE", "updates.log")
+DEDUP_WINDOW = int(os.getenv("DEDUP_WINDOW", "10000"))
+
+# Через сколько секунд после последней правки пожеланий уведомлять дарителя
+WISHLIST_NOTIFY_DELAY = float(os.getenv("WISHLIST_NOTIFY_DELAY", "60"))
+
+# Сколько секунд ждать остальные фото альбома с QR-кодами и сколько фото скачивать одновременно
+QR_ALBUM_WINDOW = float(os.getenv("QR_ALBUM_WINDOW", "1.0"))
+QR_DOWNLOAD_CONCURRENCY = int(os.getenv("QR_DOWNLOAD_CONCURRENCY", "4"))
+
+# Сколько последних сообщений анонимной переписки хранить в группе
+RELAY_LOG_SIZE = int(os.getenv("RELAY_LOG_SIZE", "50"))
+
+# Журнал запланированных заданий (распределение и напоминания по расписанию)
+SCHEDULER_FILE = os.getenv("SCHEDULER_FILE", "jobs.log")
+# Часовой пояс, в котором админы указывают даты (смещение от UTC в часах)
+TIMEZONE_OFFSET = float(os.getenv("TIMEZONE_OFFSET", "3"))
+# Через сколько дней без изменений распределённая группа переносится в архив (0 — не архивировать)
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "60"))
+
+# Уровень и формат логов (text или json)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# Одинаковые предупреждения и ошибки: не больше LOG_ERROR_BURST за LOG_ERROR_WINDOW секунд
+LOG_ERROR_BURST = int(os.getenv("LOG_ERROR_BURST", "5"))
+LOG_ERROR_WINDOW = float(os.getenv("LOG_ERROR_WINDOW", "60"))
+
+# Доля обновлений, для которых пишутся трассы (0 — трассировка выключена), и файл трасс
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
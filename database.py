@@ -1,30 +1,323 @@
+import asyncio
 import json
+import logging
 import os
-from typing import Dict, List, Optional
+import shutil
+import tempfile
+import time
+from dataclasses import replace
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 import random
 import string
+import migrations
+from cold_storage import ColdArchive
+from models import DELIVERY_FAILED, DELIVERY_PENDING, Assignment, Group, Participant, QRCode, RelayMessage
+from tracing import traced
 
-DB_FILE = "data.json"
+DB_FILE = os.getenv("DB_FILE", "data.json")
+# Каталог холодного архива завершённых групп
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+
+logger = logging.getLogger(__name__)
+
+# Данные в памяти: файл читается один раз, дальше изменения пишутся из памяти.
+# Это снимок: ни он, ни группы в нём после публикации не меняются. Запись
+# копирует изменяемую группу, собирает новый снимок и подменяет ссылку,
+# поэтому читатели не ждут писателей, а запись на диск идёт в отдельном потоке.
+_data: Optional[Dict] = None
+# Буфер отложенной записи (None — каждое изменение пишется сразу)
+_write_behind: Optional["WriteBehindBuffer"] = None
+# Холодный архив (создаётся при первом обращении)
+_archive: Optional[ColdArchive] = None
+
+
+def write_atomic(path: str, payload: Union[str, Iterable[str]]):
+    """Атомарная запись файла: временный файл, fsync и переименование.
+
+    `payload` — строка или последовательность частей, которые пишутся по мере получения.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.")
+
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            if isinstance(payload, str):
+                f.write(payload)
+            else:
+                for chunk in payload:
+                    f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    # Фиксируем переименование в каталоге
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def serialize_db(data: Dict) -> str:
+    """Представление базы для записи на диск"""
+    return "".join(iter_serialize_db(data))
+
+
+def iter_serialize_db(data: Dict) -> Iterator[str]:
+    """То же, что serialize_db, но частями.
+
+    Для записи в отдельном потоке: склейка всего JSON одной строкой надолго
+    занимает GIL и останавливает цикл событий.
+    """
+    encoder = json.JSONEncoder(ensure_ascii=False, indent=2)
+    yield f'{{\n  "schema_version": {migrations.SCHEMA_VERSION},\n  "groups": {{'
+    for index, (invite_code, group) in enumerate(data["groups"].items()):
+        yield "," if index else ""
+        yield f"\n    {json.dumps(invite_code)}: "
+        # Каждая группа кодируется отдельно, со сдвигом под вложенность
+        yield encoder.encode(group.to_dict()).replace("\n", "\n    ")
+    yield "\n  }\n}" if data["groups"] else "}\n}"
+
+
+def deserialize_db(raw: Dict) -> Dict:
+    """Преобразование прочитанного файла в записи"""
+    return make_snapshot({invite_code: Group.from_dict(group) for invite_code, group in raw["groups"].items()})
+
+
+def make_snapshot(groups: Dict[str, Group]) -> Dict:
+    """Снимок базы: группы доступны только для чтения"""
+    return {"groups": MappingProxyType(groups)}
+
+
+class WriteBehindBuffer:
+    """Объединение изменений, пришедших за короткое окно, в одну запись на диск.
+
+    Запись откладывается на `interval` секунд после последнего изменения, но
+    не дольше чем на `max_latency` секунд после первого незаписанного.
+    """
+
+    def __init__(self, interval: float, max_latency: float):
+        self.interval = interval
+        self.max_latency = max_latency
+        self._loop = asyncio.get_running_loop()
+        self._dirty = False
+        self._first_dirty_at: Optional[float] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushing: Optional[asyncio.Task] = None
+        self._waiters: List[asyncio.Future] = []
+
+    def mark_dirty(self):
+        """Отметка об изменении данных и планирование записи"""
+        now = self._loop.time()
+        if self._first_dirty_at is None:
+            self._first_dirty_at = now
+        self._dirty = True
+
+        if self._flushing is not None:
+            # Текущая запись подхватит изменение, когда закончит
+            return
+
+        deadline = min(now + self.interval, self._first_dirty_at + self.max_latency)
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = self._loop.call_at(deadline, self._start_flush)
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._flushing is None:
+            self._flushing = self._loop.create_task(self._flush())
+
+    async def _flush(self):
+        try:
+            while self._dirty:
+                self._dirty = False
+                self._first_dirty_at = None
+                waiters, self._waiters = self._waiters, []
+
+                # Снимок неизменяем, поэтому и сериализация, и запись идут в отдельном потоке
+                snapshot = _data
+                try:
+                    await asyncio.to_thread(write_atomic, DB_FILE, iter_serialize_db(snapshot))
+                except Exception as e:
+                    logger.error("Не удалось записать базу данных: %s", e)
+                    for waiter in waiters:
+                        if not waiter.done():
+                            waiter.set_exception(e)
+                    # Повторим запись позже
+                    self._dirty = True
+                    self._first_dirty_at = self._loop.time()
+                    self._timer = self._loop.call_later(self.interval, self._start_flush)
+                    return
+
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(None)
+        finally:
+            self._flushing = None
+
+    async def wait_durable(self):
+        """Ожидание, пока все сделанные изменения окажутся на диске"""
+        if self._dirty:
+            waiter = self._loop.create_future()
+            self._waiters.append(waiter)
+            self._start_flush()
+            await waiter
+        elif self._flushing is not None:
+            await asyncio.shield(self._flushing)
+
+    async def close(self):
+        """Запись оставшихся изменений и остановка буфера"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.wait_durable()
 
 
 def init_db():
     """Инициализация базы данных если её не существует"""
     if not os.path.exists(DB_FILE):
-        data = {"groups": {}}
-        save_db(data)
+        write_atomic(DB_FILE, serialize_db(make_snapshot({})))
 
 
 def load_db() -> Dict:
-    """Загрузка данных из JSON файла"""
-    init_db()
-    with open(DB_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    """Загрузка данных из JSON файла (один раз, далее из памяти)"""
+    global _data
+    if _data is None:
+        init_db()
+        with open(DB_FILE, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        if raw.get("schema_version", 0) != migrations.SCHEMA_VERSION:
+            _data = migrate_db(raw)
+        else:
+            _data = deserialize_db(raw)
+    return _data
+
+
+def migrate_db(raw: Dict) -> Dict:
+    """Перевод файла базы в текущую схему: резервная копия, обновление и атомарная замена.
+
+    Если шаг миграции или чтение результата падают, файл базы остаётся прежним.
+    """
+    version = raw.get("schema_version", 0)
+    migrations.check_version(version)
+    backup = None
+    if raw["groups"]:
+        backup = migrations.backup_path(DB_FILE, version)
+        shutil.copyfile(DB_FILE, backup)
+
+    try:
+        migrations.upgrade_db(raw)
+        data = deserialize_db(raw)
+        write_atomic(DB_FILE, serialize_db(data))
+    except Exception:
+        logger.exception(
+            "Не удалось перевести базу со схемы %s на %s, файл не изменён", version, migrations.SCHEMA_VERSION
+        )
+        raise
+
+    logger.info(
+        "База переведена со схемы %s на %s, групп: %s, резервная копия: %s",
+        version, migrations.SCHEMA_VERSION, len(data["groups"]), backup
+    )
+    return data
 
 
 def save_db(data: Dict):
-    """Сохранение данных в JSON файл"""
-    with open(DB_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    """Публикация нового снимка и его сохранение: сразу или через буфер отложенной записи"""
+    global _data
+    _data = data
+    if _write_behind is not None:
+        _write_behind.mark_dirty()
+    else:
+        write_atomic(DB_FILE, serialize_db(data))
+
+
+def start_write_behind(interval: float, max_latency: float):
+    """Включение отложенной записи (нужен запущенный цикл событий)"""
+    global _write_behind
+    _write_behind = WriteBehindBuffer(interval, max_latency)
+
+
+def publish_group(invite_code: str, group: Optional[Group]):
+    """Новый снимок, в котором заменена одна группа (None — группа удаляется).
+
+    Копируется только таблица ссылок на группы; сами группы, кроме
+    переданной, общие со старым снимком.
+    """
+    groups = dict(load_db()["groups"])
+    if group is None:
+        groups.pop(invite_code, None)
+    else:
+        groups[invite_code] = group
+    save_db(make_snapshot(groups))
+
+
+async def stop_write_behind():
+    """Запись оставшихся изменений и возврат к немедленной записи"""
+    global _write_behind
+    if _write_behind is not None:
+        buffer = _write_behind
+        _write_behind = None
+        await buffer.close()
+
+
+@traced("db.wait_durable")
+async def wait_durable():
+    """Ожидание записи всех изменений на диск"""
+    if _write_behind is not None:
+        await _write_behind.wait_durable()
+
+
+class VersionConflict(Exception):
+    """Группа изменилась с момента, когда её прочитали"""
+
+    def __init__(self, invite_code: str, expected_version: int, actual_version: int):
+        super().__init__(
+            f"Группа {invite_code} изменилась: ожидалась версия {expected_version}, текущая {actual_version}"
+        )
+        self.invite_code = invite_code
+        self.expected_version = expected_version
+        self.actual_version = actual_version
+
+
+def touch_group(group: Group):
+    """Увеличение версии группы и отметка времени последнего изменения"""
+    group.version += 1
+    group.updated_at = time.time()
+
+
+@traced("db.update_group")
+def update_group(invite_code: str, mutator: Callable[[Group], bool], expected_version: Optional[int] = None) -> Optional[Group]:
+    """Изменение группы с проверкой версии (compare-and-swap).
+
+    `mutator` получает копию актуальной группы и возвращает False, если
+    изменение невозможно (копия тогда отбрасывается). Если передан `expected_version` и группа с тех пор изменилась,
+    выбрасывается VersionConflict. Без `expected_version` изменение применяется
+    к актуальному состоянию. Возвращает изменённую группу или None.
+    """
+    current = get_group(invite_code)
+
+    if current is None:
+        return None
+
+    if expected_version is not None and current.version != expected_version:
+        raise VersionConflict(invite_code, expected_version, current.version)
+
+    # Читатели старого снимка продолжают видеть неизменённую группу
+    group = current.clone()
+    if mutator(group) is False:
+        return None
+
+    touch_group(group)
+    publish_group(invite_code, group)
+    return group
 
 
 def generate_invite_code() -> str:
@@ -32,282 +325,314 @@ def generate_invite_code() -> str:
     return ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
 
 
+@traced("db.create_group")
 def create_group(admin_id: int, admin_name: str, admin_username: Optional[str], group_name: str) -> str:
     """Создание новой группы"""
     data = load_db()
 
     invite_code = generate_invite_code()
     # Проверяем уникальность кода
-    while invite_code in data["groups"]:
+    while invite_code in data["groups"] or get_archive().contains(invite_code):
         invite_code = generate_invite_code()
 
-    data["groups"][invite_code] = {
-        "name": group_name,
-        "admin_id": admin_id,
-        "invite_code": invite_code,
-        "participants": {
-            str(admin_id): {
-                "first_name": admin_name,
-                "username": admin_username,
-                "wishlist": ""
-            }
-        },
-        "assignments": {},
-        "is_distributed": False
-    }
-
-    save_db(data)
+    group = Group(name=group_name, admin_id=admin_id, invite_code=invite_code)
+    group.set_participant(admin_id, Participant.from_dict({"first_name": admin_name, "username": admin_username}))
+    touch_group(group)
+    publish_group(invite_code, group)
     return invite_code
 
 
-def get_group(invite_code: str) -> Optional[Dict]:
-    """Получение информации о группе"""
+@traced("db.get_group")
+def get_group(invite_code: str) -> Optional[Group]:
+    """Получение информации о группе (архивная группа возвращается в рабочую базу)"""
     data = load_db()
-    return data["groups"].get(invite_code)
+    group = data["groups"].get(invite_code)
 
+    if group is None and get_archive().contains(invite_code):
+        group = restore_group(invite_code)
 
-def join_group(invite_code: str, user_id: int, user_name: str, username: Optional[str]) -> bool:
-    """Присоединение пользователя к группе"""
-    data = load_db()
+    return group
 
-    if invite_code not in data["groups"]:
-        return False
 
-    group = data["groups"][invite_code]
+@traced("db.join_group")
+def join_group(invite_code: str, user_id: int, user_name: str, username: Optional[str]) -> Optional[Group]:
+    """Присоединение пользователя к группе. Возвращает обновлённую группу"""
+    def add_participant(group: Group) -> bool:
+        # Проверяем, что распределение ещё не началось
+        if group.is_distributed:
+            return False
 
-    # Проверяем, что распределение ещё не началось
-    if group["is_distributed"]:
-        return False
+        # Добавляем пользователя
+        group.set_participant(user_id, Participant.from_dict({"first_name": user_name, "username": username}))
+        return True
 
-    # Добавляем пользователя
-    group["participants"][str(user_id)] = {
-        "first_name": user_name,
-        "username": username,
-        "wishlist": ""
-    }
-
-    save_db(data)
-    return True
+    return update_group(invite_code, add_participant)
 
 
+@traced("db.get_user_groups")
 def get_user_groups(user_id: int) -> List[Dict]:
     """Получение списка групп пользователя"""
     data = load_db()
     user_groups = []
 
     for invite_code, group in data["groups"].items():
-        if str(user_id) in group["participants"]:
+        if user_id in group.participants:
             user_groups.append({
-                "name": group["name"],
+                "name": group.name,
                 "invite_code": invite_code,
-                "is_admin": group["admin_id"] == user_id,
-                "participants_count": len(group["participants"]),
-                "is_distributed": group["is_distributed"]
+                "is_admin": group.admin_id == user_id,
+                "participants_count": len(group.participants),
+                "is_distributed": group.is_distributed
             })
 
+    # Архивные группы берутся из индекса архива без распаковки
+    for summary in get_archive().user_groups(user_id):
+        if summary["invite_code"] in data["groups"]:
+            continue
+        user_groups.append({
+            "name": summary["name"],
+            "invite_code": summary["invite_code"],
+            "is_admin": summary["admin_id"] == user_id,
+            "participants_count": summary["participants_count"],
+            "is_distributed": True
+        })
+
     return user_groups
 
 
+@traced("db.set_wishlist")
 def set_wishlist(user_id: int, invite_code: str, wishlist: str) -> bool:
     """Установка списка пожеланий пользователя"""
-    data = load_db()
+    def update_wishlist(group: Group) -> bool:
+        if user_id not in group.participants:
+            return False
 
-    if invite_code not in data["groups"]:
-        return False
-
-    group = data["groups"][invite_code]
-
-    if str(user_id) not in group["participants"]:
-        return False
+        group.set_participant(user_id, replace(group.participants[user_id], wishlist=wishlist))
+        return True
 
-    group["participants"][str(user_id)]["wishlist"] = wishlist
-    save_db(data)
-    return True
+    return update_group(invite_code, update_wishlist) is not None
 
 
+@traced("db.get_wishlist")
 def get_wishlist(user_id: int, invite_code: str) -> Optional[str]:
     """Получение списка пожеланий пользователя"""
-    data = load_db()
+    group = load_db()["groups"].get(invite_code)
 
-    if invite_code not in data["groups"]:
+    if group is None or user_id not in group.participants:
         return None
 
-    group = data["groups"][invite_code]
+    return group.participants[user_id].wishlist
+
+
+@traced("db.distribute_santa")
+def distribute_santa(invite_code: str, expected_roster: Optional[int] = None) -> Optional[Group]:
+    """Случайное распределение участников Тайного Санты. Возвращает обновлённую группу.
+
+    Если передан `expected_roster`, а список участников с тех пор изменился или
+    группа уже распределена, выбрасывается VersionConflict.
+    """
+    def assign(group: Group) -> bool:
+        # Пожелания и переписка на распределение не влияют, поэтому сравнивается только список участников
+        if expected_roster is not None and (group.is_distributed or group.roster_version != expected_roster):
+            raise VersionConflict(invite_code, expected_roster, group.roster_version)
+
+        # Проверяем количество участников (минимум 3)
+        if len(group.participants) < 3:
+            return False
+
+        # Перемешиваем список участников
+        shuffled = list(group.participants)
+        random.shuffle(shuffled)
+
+        # Создаём распределение по кругу
+        group.set_assignments({
+            giver: Assignment(receiver_id=shuffled[(i + 1) % len(shuffled)])
+            for i, giver in enumerate(shuffled)
+        })
+        group.is_distributed = True
+        # Переписка прежних пар не должна попасть к новым собеседникам
+        group.relay_log = ()
+        return True
 
-    if str(user_id) not in group["participants"]:
-        return None
+    return update_group(invite_code, assign)
 
-    return group["participants"][str(user_id)].get("wishlist", "")
 
+@traced("db.get_recipient")
+def get_recipient(user_id: int, invite_code: str) -> Optional[Dict]:
+    """Получение информации о получателе подарка"""
+    group = load_db()["groups"].get(invite_code)
 
-def distribute_santa(invite_code: str) -> bool:
-    """Случайное распределение участников Тайного Санты"""
-    data = load_db()
+    if group is None or not group.is_distributed:
+        return None
 
-    if invite_code not in data["groups"]:
-        return False
+    assignment = group.assignments.get(user_id)
+    if assignment is None:
+        return None
 
-    group = data["groups"][invite_code]
+    recipient_info = group.participants[assignment.receiver_id]
 
-    # Проверяем количество участников (минимум 3)
-    if len(group["participants"]) < 3:
-        return False
+    return {
+        "first_name": recipient_info.first_name,
+        "username": recipient_info.username,
+        "wishlist": recipient_info.wishlist,
+        "qr_code_paths": [qr_code.path for qr_code in assignment.qr_codes]
+    }
 
-    # Получаем список ID участников
-    participants = list(group["participants"].keys())
 
-    # Перемешиваем список
-    shuffled = participants.copy()
-    random.shuffle(shuffled)
+@traced("db.cancel_distribution")
+def cancel_distribution(invite_code: str) -> bool:
+    """Отмена распределения"""
+    def reset(group: Group) -> bool:
+        group.set_assignments({})
+        group.is_distributed = False
+        group.relay_log = ()
+        return True
 
-    # Создаём распределение по кругу
-    assignments = {}
-    for i in range(len(shuffled)):
-        giver = shuffled[i]
-        receiver = shuffled[(i + 1) % len(shuffled)]
-        assignments[giver] = {
-            "receiver_id": receiver,
-            "qr_code_path": None
-        }
+    return update_group(invite_code, reset) is not None
 
-    group["assignments"] = assignments
-    group["is_distributed"] = True
 
-    save_db(data)
-    return True
+@traced("db.set_delivery_status")
+def set_delivery_status(invite_code: str, giver_id: int, receiver_id: int, status: str) -> bool:
+    """Отметка о доставке уведомления дарителю (только если распределение не менялось)"""
+    def mark(group: Group) -> bool:
+        assignment = group.assignments.get(giver_id)
+        if assignment is None or assignment.receiver_id != receiver_id or assignment.delivery == status:
+            return False
+        group.set_assignment(giver_id, replace(assignment, delivery=status))
+        return True
 
+    return update_group(invite_code, mark) is not None
 
-def get_recipient(user_id: int, invite_code: str) -> Optional[Dict]:
-    """Получение информации о получателе подарка"""
-    data = load_db()
 
-    if invite_code not in data["groups"]:
-        return None
+@traced("db.reset_failed_deliveries")
+def reset_failed_deliveries(invite_code: str) -> int:
+    """Возврат неудачных уведомлений в очередь на отправку. Возвращает их число"""
+    reset_count = 0
 
-    group = data["groups"][invite_code]
+    def reset(group: Group) -> bool:
+        nonlocal reset_count
+        for giver_id, assignment in group.assignments.items():
+            if assignment.delivery == DELIVERY_FAILED:
+                group.set_assignment(giver_id, replace(assignment, delivery=DELIVERY_PENDING))
+                reset_count += 1
+        return reset_count > 0
 
-    if not group["is_distributed"]:
-        return None
+    update_group(invite_code, reset)
+    return reset_count
 
-    if str(user_id) not in group["assignments"]:
-        return None
 
-    assignment = group["assignments"][str(user_id)]
+@traced("db.add_relay_message")
+def add_relay_message(invite_code: str, sender_id: int, to_giver: bool, text: str, log_size: int) -> Optional[int]:
+    """Запись сообщения анонимной переписки. Возвращает ID собеседника или None, если его нет.
 
-    # Обратная совместимость: если assignment это строка (старый формат)
-    if isinstance(assignment, str):
-        recipient_id = assignment
-        qr_code_path = None
-    else:
-        recipient_id = assignment["receiver_id"]
-        qr_code_path = assignment.get("qr_code_path")
+    `to_giver` — отправитель пишет своему Санте, иначе — своему получателю.
+    В группе остаются только `log_size` последних сообщений.
+    """
+    recipient_id = None
 
-    recipient_info = group["participants"][recipient_id]
-
-    return {
-        "first_name": recipient_info["first_name"],
-        "username": recipient_info["username"],
-        "wishlist": recipient_info.get("wishlist", ""),
-        "qr_code_path": qr_code_path
-    }
+    def add(group: Group) -> bool:
+        nonlocal recipient_id
+        if not group.is_distributed:
+            return False
 
+        if to_giver:
+            giver_id = recipient_id = group.giver_of(sender_id)
+        else:
+            assignment = group.assignments.get(sender_id)
+            giver_id = sender_id
+            recipient_id = assignment.receiver_id if assignment else None
+        if recipient_id is None:
+            return False
+
+        message = RelayMessage(giver_id=giver_id, to_giver=to_giver, text=text, sent_at=time.time())
+        group.relay_log = (*group.relay_log, message)[-log_size:]
+        return True
 
-def cancel_distribution(invite_code: str) -> bool:
-    """Отмена распределения"""
-    data = load_db()
+    if update_group(invite_code, add) is None:
+        return None
+    return recipient_id
 
-    if invite_code not in data["groups"]:
-        return False
 
-    group = data["groups"][invite_code]
-    group["assignments"] = {}
-    group["is_distributed"] = False
+@traced("db.get_relay_messages")
+def get_relay_messages(invite_code: str, giver_id: int, limit: int) -> List[RelayMessage]:
+    """Последние сообщения переписки дарителя `giver_id` с его получателем"""
+    group = load_db()["groups"].get(invite_code)
+    if group is None:
+        return []
 
-    save_db(data)
-    return True
+    messages = [message for message in group.relay_log if message.giver_id == giver_id]
+    return messages[-limit:]
 
 
-def save_qr_code_path(invite_code: str, giver_id: int, file_path: str) -> bool:
-    """Сохранение пути к QR-коду для дарителя"""
-    data = load_db()
+@traced("db.save_qr_codes")
+def save_qr_codes(invite_code: str, giver_id: int, qr_codes: List[QRCode]) -> bool:
+    """Сохранение QR-кодов дарителя (заменяют загруженные ранее)"""
+    def set_qr_codes(group: Group) -> bool:
+        if not group.is_distributed or giver_id not in group.assignments:
+            return False
 
-    if invite_code not in data["groups"]:
-        return False
+        group.set_assignment(giver_id, replace(group.assignments[giver_id], qr_codes=tuple(qr_codes)))
+        return True
 
-    group = data["groups"][invite_code]
+    return update_group(invite_code, set_qr_codes) is not None
 
-    if not group["is_distributed"]:
-        return False
 
-    if str(giver_id) not in group["assignments"]:
-        return False
+@traced("db.set_qr_file_ids")
+def set_qr_file_ids(invite_code: str, giver_id: int, file_ids: Dict[str, str]) -> bool:
+    """Запоминание ID фото в Telegram для QR-кодов, отправленных из файлов (путь → file_id)"""
+    def set_file_ids(group: Group) -> bool:
+        assignment = group.assignments.get(giver_id)
+        if assignment is None:
+            return False
 
-    assignment = group["assignments"][str(giver_id)]
+        qr_codes = tuple(
+            replace(qr_code, file_id=file_ids[qr_code.path]) if qr_code.path in file_ids else qr_code
+            for qr_code in assignment.qr_codes
+        )
+        if qr_codes == assignment.qr_codes:
+            return False
+        group.set_assignment(giver_id, replace(assignment, qr_codes=qr_codes))
+        return True
 
-    # Обратная совместимость: конвертируем старый формат в новый
-    if isinstance(assignment, str):
-        group["assignments"][str(giver_id)] = {
-            "receiver_id": assignment,
-            "qr_code_path": file_path
-        }
-    else:
-        assignment["qr_code_path"] = file_path
+    return update_group(invite_code, set_file_ids) is not None
 
-    save_db(data)
-    return True
 
+@traced("db.get_qr_codes_for_recipient")
+def get_qr_codes_for_recipient(invite_code: str, receiver_id: int) -> Tuple[QRCode, ...]:
+    """QR-коды для получателя (находит кто дарит ему подарок); пусто, если не загружены"""
+    group = load_db()["groups"].get(invite_code)
 
-def get_qr_code_for_recipient(invite_code: str, receiver_id: int) -> Optional[str]:
-    """Получение пути к QR-коду для получателя (находит кто дарит ему подарок)"""
-    data = load_db()
+    if group is None or not group.is_distributed:
+        return ()
 
-    if invite_code not in data["groups"]:
-        return None
+    giver_id = group.giver_of(receiver_id)
+    if giver_id is None:
+        return ()
 
-    group = data["groups"][invite_code]
+    return group.assignments[giver_id].qr_codes
 
-    if not group["is_distributed"]:
-        return None
 
-    # Ищем кто дарит подарок этому получателю
-    for giver_id, assignment in group["assignments"].items():
-        # Обратная совместимость
-        if isinstance(assignment, str):
-            recipient_id = assignment
-            qr_code_path = None
-        else:
-            recipient_id = assignment["receiver_id"]
-            qr_code_path = assignment.get("qr_code_path")
+@traced("db.get_giver_id")
+def get_giver_id(invite_code: str, receiver_id: int) -> Optional[int]:
+    """Получение ID дарителя, который дарит подарок получателю"""
+    group = load_db()["groups"].get(invite_code)
 
-        if recipient_id == str(receiver_id):
-            return qr_code_path
+    if group is None or not group.is_distributed:
+        return None
 
-    return None
+    return group.giver_of(receiver_id)
 
 
+@traced("db.has_qr_code")
 def has_qr_code(invite_code: str, giver_id: int) -> bool:
     """Проверка наличия загруженного QR-кода у дарителя"""
-    data = load_db()
-
-    if invite_code not in data["groups"]:
-        return False
-
-    group = data["groups"][invite_code]
-
-    if not group["is_distributed"]:
-        return False
-
-    if str(giver_id) not in group["assignments"]:
-        return False
+    group = load_db()["groups"].get(invite_code)
 
-    assignment = group["assignments"][str(giver_id)]
-
-    # Обратная совместимость
-    if isinstance(assignment, str):
+    if group is None or not group.is_distributed:
         return False
 
-    qr_code_path = assignment.get("qr_code_path")
-    return qr_code_path is not None and qr_code_path != ""
+    assignment = group.assignments.get(giver_id)
+    return assignment is not None and bool(assignment.qr_codes)
 
 
 def delete_qr_code_file(file_path: str) -> bool:
@@ -319,10 +644,11 @@ def delete_qr_code_file(file_path: str) -> bool:
         os.remove(file_path)
         return True
     except Exception as e:
-        print(f"Ошибка при удалении файла {file_path}: {e}")
+        logger.warning("Ошибка при удалении файла %s: %s", file_path, e)
         return False
 
 
+@traced("db.delete_group")
 def delete_group(invite_code: str) -> bool:
     """Удаление группы вместе со всеми QR-кодами"""
     data = load_db()
@@ -333,16 +659,121 @@ def delete_group(invite_code: str) -> bool:
     group = data["groups"][invite_code]
 
     # Удаляем все QR-коды группы
-    if group.get("is_distributed") and group.get("assignments"):
-        for giver_id, assignment in group["assignments"].items():
-            # Обратная совместимость
-            if isinstance(assignment, dict):
-                qr_code_path = assignment.get("qr_code_path")
-                if qr_code_path:
-                    delete_qr_code_file(qr_code_path)
-
-    # Удаляем группу из базы данных
-    del data["groups"][invite_code]
-    save_db(data)
+    for qr_code_path in group.qr_code_paths():
+        delete_qr_code_file(qr_code_path)
+
+    # Удаляем группу из базы данных и её копию из архива
+    publish_group(invite_code, None)
+    get_archive().discard(invite_code)
+
+    return True
+
+
+@traced("db.add_participants")
+def add_participants(invite_code: str, participants: List[Dict]) -> Optional[Dict]:
+    """Пакетное добавление участников одной записью в базу"""
+    added = []
+    duplicates = []
+
+    def add_batch(group: Group) -> bool:
+        # После распределения новых участников добавлять нельзя
+        if group.is_distributed:
+            return False
+
+        for participant in participants:
+            user_id = participant["user_id"]
+            if user_id in group.participants:
+                duplicates.append(participant)
+                continue
+
+            group.set_participant(user_id, Participant.from_dict(participant))
+            added.append(participant)
+
+        return True
+
+    if update_group(invite_code, add_batch) is None:
+        return None
+
+    return {"added": added, "duplicates": duplicates}
+
+
+def get_archive() -> ColdArchive:
+    """Холодный архив в каталоге ARCHIVE_DIR"""
+    global _archive
+    if _archive is None or _archive.directory != ARCHIVE_DIR:
+        _archive = ColdArchive(ARCHIVE_DIR)
+    return _archive
+
+
+def peek_group(invite_code: str) -> Optional[Group]:
+    """Группа из рабочей базы без обращения к архиву"""
+    return load_db()["groups"].get(invite_code)
+
+
+@traced("db.read_group")
+def read_group(invite_code: str) -> Optional[Group]:
+    """Группа только для чтения: архивная читается из архива без возврата в рабочую базу.
+
+    Ничего не меняет, поэтому её можно вызывать из другого потока и из
+    отдельного процесса (выгрузка).
+    """
+    group = peek_group(invite_code)
+    if group is None:
+        raw = get_archive().read(invite_code)
+        if raw is not None:
+            group = Group.from_dict(raw)
+    return group
+
+
+@traced("db.restore_group")
+def restore_group(invite_code: str) -> Optional[Group]:
+    """Возврат группы из архива в рабочую базу"""
+    return _install_restored(invite_code, get_archive().restore(invite_code))
+
+
+@traced("db.restore_group_async")
+async def restore_group_async(invite_code: str) -> Optional[Group]:
+    """Возврат группы из архива; распаковка идёт в отдельном потоке"""
+    raw = await asyncio.to_thread(get_archive().restore, invite_code)
+    return _install_restored(invite_code, raw)
+
+
+def _install_restored(invite_code: str, raw: Optional[Dict]) -> Optional[Group]:
+    data = load_db()
+    # Пока шла распаковка, группу мог вернуть другой обработчик
+    if invite_code in data["groups"]:
+        return data["groups"][invite_code]
+    if raw is None:
+        return None
+
+    group = Group.from_dict(raw)
+    # Открытие группы считается активностью, иначе её сразу заархивирует следующий обход
+    touch_group(group)
+    publish_group(invite_code, group)
+    logger.info("Группа %s восстановлена из архива", invite_code)
+    return group
+
+
+@traced("db.find_inactive_groups")
+def find_inactive_groups(max_idle: float) -> List[str]:
+    """Коды распределённых групп, которые не менялись дольше `max_idle` секунд"""
+    data = load_db()
+    threshold = time.time() - max_idle
+
+    return [
+        invite_code for invite_code, group in data["groups"].items()
+        if group.is_distributed and group.updated_at <= threshold
+    ]
+
+
+@traced("db.remove_archived_group")
+def remove_archived_group(invite_code: str, expected_version: int) -> bool:
+    """Удаление заархивированной группы из рабочей базы, если она не менялась с момента упаковки"""
+    data = load_db()
+    group = data["groups"].get(invite_code)
+
+    if group is None or group.version != expected_version:
+        return False
 
+    publish_group(invite_code, None)
     return True
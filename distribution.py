@@ -0,0 +1,164 @@
+import logging
+import time
+from typing import Dict
+from aiogram import Bot
+import database as db
+from bot_session import bulk
+import keyboards as kb
+from models import DELIVERY_FAILED, DELIVERY_PENDING, DELIVERY_SENT, Group
+from outbox import outbox
+from scheduler import job_handler, scheduler
+
+# Типы заданий планировщика
+SCHEDULED_DISTRIBUTION = "distribute"
+QR_REMINDER = "remind_qr"
+NOTIFY_ASSIGNMENTS = "notify"
+
+logger = logging.getLogger(__name__)
+
+
+async def send_assignment(bot: Bot, group: Group, giver_id: int, receiver_id: int) -> bool:
+    """Сообщение дарителю с именем его получателя"""
+    recipient_info = group.participants[receiver_id]
+
+    username_text = f"@{recipient_info.username}" if recipient_info.username else ""
+    wishlist_text = f"\n\n🎁 <b>Пожелания:</b>\n{recipient_info.wishlist}" if recipient_info.wishlist else "\n\n(Список пожеланий пока не указан)"
+
+    try:
+        await bot.send_message(
+            chat_id=giver_id,
+            text=f"🎅 <b>Распределение в группе \"{group.name}\" завершено!</b>\n\n"
+                 f"🎁 Вы дарите подарок:\n"
+                 f"👤 <b>{recipient_info.first_name}</b> {username_text}"
+                 f"{wishlist_text}\n\n"
+                 f"Сохраните эту информацию в секрете! 🤫",
+            parse_mode="HTML"
+        )
+    except Exception as e:
+        logger.warning("Не удалось отправить сообщение пользователю %s: %s", giver_id, e)
+        return False
+    return True
+
+
+def distribution_report(group: Group) -> str:
+    """Отчёт админу о результатах рассылки"""
+    sent_count = len(group.givers_with_delivery(DELIVERY_SENT))
+    failed = group.givers_with_delivery(DELIVERY_FAILED)
+
+    result_text = f"✅ <b>Распределение завершено!</b>\n\n" \
+                  f"📊 Уведомления отправлены: {sent_count}/{len(group.assignments)}\n"
+
+    if failed:
+        result_text += f"\n⚠️ Не удалось отправить сообщения:\n" + "\n".join(
+            [f"• {group.participants[giver_id].first_name}" for giver_id in failed]
+        )
+        result_text += "\n\nПопросите этих участников написать боту /start и отправьте уведомления ещё раз"
+
+    return result_text
+
+
+def start_notifications(invite_code: str, scheduled: bool = False):
+    """Запуск рассылки получателей как задания планировщика.
+
+    Задание лежит в журнале, пока рассылка не закончится, поэтому после
+    перезапуска бота она продолжится с того участника, на котором прервалась.
+    """
+    scheduler.schedule(NOTIFY_ASSIGNMENTS, invite_code, time.time(), scheduled=scheduled)
+
+
+@job_handler(NOTIFY_ASSIGNMENTS)
+async def run_notify_assignments(bot: Bot, job: Dict):
+    """Рассылка участникам имён их получателей с отметкой о доставке каждому"""
+    invite_code = job["invite_code"]
+    group = db.get_group(invite_code)
+
+    if not group or not group.is_distributed:
+        return
+
+    pending = [
+        (giver_id, group.assignments[giver_id].receiver_id)
+        for giver_id in group.givers_with_delivery(DELIVERY_PENDING)
+    ]
+
+    # Рассылка идёт с фоновым приоритетом и не задерживает ответы другим пользователям
+    with bulk():
+        for giver_id, receiver_id in pending:
+            # Распределение могли отменить или переделать, пока шла рассылка
+            group = db.get_group(invite_code)
+            if not group or not group.is_distributed:
+                return
+            assignment = group.assignments.get(giver_id)
+            if assignment is None or assignment.receiver_id != receiver_id or assignment.delivery != DELIVERY_PENDING:
+                continue
+
+            delivered = await send_assignment(bot, group, giver_id, receiver_id)
+            db.set_delivery_status(invite_code, giver_id, receiver_id, DELIVERY_SENT if delivered else DELIVERY_FAILED)
+
+    group = db.get_group(invite_code)
+    if not group or not group.is_distributed:
+        return
+
+    title = f"⏰ Группа \"{group.name}\": распределение по расписанию\n\n" if job.get("scheduled") else ""
+    await bot.send_message(
+        chat_id=group.admin_id,
+        text=title + distribution_report(group),
+        reply_markup=kb.notifications_report(invite_code, bool(group.givers_with_delivery(DELIVERY_FAILED))),
+        parse_mode="HTML"
+    )
+    logger.info("Рассылка получателей завершена: группа %s", invite_code)
+
+
+@job_handler(SCHEDULED_DISTRIBUTION)
+async def run_scheduled_distribution(bot: Bot, job: Dict):
+    """Распределение по расписанию"""
+    invite_code = job["invite_code"]
+    group = db.get_group(invite_code)
+
+    if not group or group.is_distributed:
+        return
+
+    if len(group.participants) < 3:
+        await bot.send_message(
+            chat_id=group.admin_id,
+            text=f"⚠️ <b>Распределение по расписанию не выполнено</b>\n\n"
+                 f"В группе \"{group.name}\" меньше 3 участников.",
+            parse_mode="HTML"
+        )
+        return
+
+    group = db.distribute_santa(invite_code)
+    if not group:
+        return
+
+    # Распределение должно быть на диске до того, как участники узнают получателей
+    await db.wait_durable()
+
+    start_notifications(invite_code, scheduled=True)
+    logger.info("Выполнено распределение по расписанию: группа %s", invite_code)
+
+
+@job_handler(QR_REMINDER)
+async def send_qr_reminders(bot: Bot, job: Dict):
+    """Напоминание дарителям, которые ещё не загрузили QR-код"""
+    invite_code = job["invite_code"]
+    group = db.get_group(invite_code)
+
+    if not group or not group.is_distributed:
+        return
+
+    reminded = 0
+    for giver_id, assignment in group.assignments.items():
+        if assignment.qr_codes:
+            continue
+
+        outbox.send_message(
+            giver_id,
+            f"⏰ <b>Напоминание</b>\n\n"
+            f"В группе <b>\"{group.name}\"</b> вы ещё не загрузили QR-код для получения подарка.\n\n"
+            f"Загрузите его, чтобы ваш получатель смог забрать посылку.",
+            reply_markup=kb.back_to_group(invite_code),
+            parse_mode="HTML"
+        )
+        reminded += 1
+
+    logger.info("Напоминания о QR-кодах поставлены в очередь: группа %s, получателей %s", invite_code, reminded)
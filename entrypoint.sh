@@ -1,14 +1,17 @@
 #!/bin/bash
 set -e
 
-# Create data.json with initial structure if it doesn't exist or is empty
-if [ ! -f "/app/data.json" ]; then
-    echo "Initializing data.json..."
-    echo '{"groups": {}}' > /app/data.json
-elif [ ! -s "/app/data.json" ]; then
+DB_FILE="${DB_FILE:-/app/data.json}"
+mkdir -p "$(dirname "$DB_FILE")"
+
+# Create the database with initial structure if it doesn't exist or is empty
+if [ ! -f "$DB_FILE" ]; then
+    echo "Initializing $DB_FILE..."
+    echo '{"groups": {}}' > "$DB_FILE"
+elif [ ! -s "$DB_FILE" ]; then
     # File exists but is empty
-    echo "Initializing empty data.json..."
-    echo '{"groups": {}}' > /app/data.json
+    echo "Initializing empty $DB_FILE..."
+    echo '{"groups": {}}' > "$DB_FILE"
 fi
 
 echo "Starting Santa Bot..."
@@ -0,0 +1,121 @@
+"""Потоковая выгрузка участников группы в CSV/JSON.
+
+Использование на сервере:
+    python exporter.py <invite_code> --format csv --output group.csv
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+from typing import Dict, Iterator, Optional, TextIO
+import database as db
+from models import Group
+
+EXPORT_FORMATS = ("csv", "json")
+
+FIELDS = ["user_id", "first_name", "username", "is_admin", "wishlist", "has_qr_code"]
+
+
+def iter_group_rows(group: Group) -> Iterator[Dict]:
+    """Построчный обход участников группы"""
+    # Группа из снимка не меняется (изменения идут на копии), поэтому обход без копирования
+    for user_id, user_info in group.participants.items():
+        assignment = group.assignments.get(user_id)
+
+        yield {
+            "user_id": user_id,
+            "first_name": user_info.first_name,
+            "username": user_info.username or "",
+            "is_admin": user_id == group.admin_id,
+            "wishlist": user_info.wishlist,
+            "has_qr_code": assignment is not None and bool(assignment.qr_codes)
+        }
+
+
+def write_csv(rows: Iterator[Dict], fp: TextIO):
+    """Запись строк в CSV по одной"""
+    writer = csv.DictWriter(fp, fieldnames=FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+
+
+def write_json(group: Group, rows: Iterator[Dict], fp: TextIO):
+    """Запись JSON-документа по одной записи, без сборки всего документа в памяти"""
+    header = {
+        "name": group.name,
+        "invite_code": group.invite_code,
+        "is_distributed": group.is_distributed
+    }
+    # Открываем объект и дописываем массив участников вручную
+    fp.write(json.dumps(header, ensure_ascii=False)[:-1])
+    fp.write(', "participants": [')
+    for i, row in enumerate(rows):
+        if i:
+            fp.write(",")
+        fp.write("\n  ")
+        fp.write(json.dumps(row, ensure_ascii=False))
+    fp.write("\n]}\n")
+
+
+def export_group(invite_code: str, fmt: str, fp: TextIO) -> bool:
+    """Выгрузка группы в открытый файл"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+
+    # Без возврата архивной группы в базу: выгрузка идёт в отдельном потоке или процессе
+    group = db.read_group(invite_code)
+    if not group:
+        return False
+
+    rows = iter_group_rows(group)
+    if fmt == "csv":
+        write_csv(rows, fp)
+    else:
+        write_json(group, rows, fp)
+    return True
+
+
+def export_to_tempfile(invite_code: str, fmt: str) -> Optional[str]:
+    """Выгрузка группы во временный файл. Возвращает путь, файл удаляет вызывающий"""
+    # utf-8-sig, чтобы Excel корректно открывал кириллицу в CSV
+    encoding = "utf-8-sig" if fmt == "csv" else "utf-8"
+    fd, path = tempfile.mkstemp(prefix=f"santa_{invite_code}_", suffix=f".{fmt}")
+
+    try:
+        with os.fdopen(fd, "w", encoding=encoding, newline="") as fp:
+            exported = export_group(invite_code, fmt, fp)
+    except Exception:
+        os.remove(path)
+        raise
+
+    if not exported:
+        os.remove(path)
+        return None
+
+    return path
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Выгрузка участников группы Тайного Санты")
+    parser.add_argument("invite_code", help="код приглашения группы")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv", help="формат выгрузки")
+    parser.add_argument("--output", help="файл для записи (по умолчанию stdout)")
+    args = parser.parse_args(argv)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as fp:
+            exported = export_group(args.invite_code, args.format, fp)
+    else:
+        exported = export_group(args.invite_code, args.format, sys.stdout)
+
+    if not exported:
+        print(f"Группа {args.invite_code} не найдена", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
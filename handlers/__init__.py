@@ -2,5 +2,8 @@ from . import start
 from . import groups
 from . import santa
 from . import qr_codes
+from . import admin
+from . import deadlines
+from . import relay
 
-__all__ = ['start', 'groups', 'santa', 'qr_codes']
+__all__ = ['start', 'groups', 'santa', 'qr_codes', 'admin', 'deadlines', 'relay']
@@ -0,0 +1,254 @@
+import asyncio
+import html
+import io
+import os
+from itertools import islice
+from typing import Collection
+from aiogram import Router, F, Bot
+from aiogram.types import CallbackQuery, FSInputFile, Message
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+import database as db
+import keyboards as kb
+import callbacks as cb
+from render_cache import edit_message
+from exporter import EXPORT_FORMATS, export_to_tempfile
+from importer import parse_participants_csv
+from models import Group
+from outbox import outbox
+from tracing import span
+
+router = Router()
+
+# Максимальный размер CSV-файла для импорта
+MAX_IMPORT_FILE_SIZE = 1024 * 1024
+# Сколько ошибок показывать в отчёте об импорте
+MAX_REPORTED_ERRORS = 10
+# Сколько имён отстающих показывать в статистике
+MAX_LAGGARD_NAMES = 10
+
+
+class ImportStates(StatesGroup):
+    waiting_for_file = State()
+    group_code = State()
+
+
+# Выгрузка участников (только для админа)
+@cb.handler(cb.ExportCallback)
+async def export_group(callback: CallbackQuery, callback_data: cb.ExportCallback):
+    """Отправка выгрузки группы файлом"""
+    invite_code = callback_data.code
+    group = db.get_group(invite_code)
+
+    if not group:
+        await callback.answer("❌ Группа не найдена", show_alert=True)
+        return
+
+    if group.admin_id != callback.from_user.id:
+        await callback.answer("❌ Только администратор может выгрузить данные группы", show_alert=True)
+        return
+
+    if callback_data.fmt not in EXPORT_FORMATS:
+        await callback.answer("❌ Неизвестный формат выгрузки", show_alert=True)
+        return
+
+    await callback.answer("⏳ Готовлю выгрузку...")
+
+    # Запись файла выполняется в отдельном потоке, чтобы не блокировать бота
+    file_path = await asyncio.to_thread(export_to_tempfile, invite_code, callback_data.fmt)
+    if not file_path:
+        await callback.message.answer("❌ Группа не найдена")
+        return
+
+    try:
+        await callback.message.answer_document(
+            FSInputFile(file_path, filename=f"santa_{invite_code}.{callback_data.fmt}"),
+            caption=f"📤 Участники группы <b>{group.name}</b>",
+            parse_mode="HTML"
+        )
+    finally:
+        os.remove(file_path)
+
+
+def _percent(part: int, total: int) -> str:
+    return f"{part * 100 // total}%" if total else "—"
+
+
+def _names(group: Group, user_ids: Collection[int]) -> str:
+    """Имена первых MAX_LAGGARD_NAMES участников из списка"""
+    names = [html.escape(group.participants[user_id].first_name) for user_id in islice(user_ids, MAX_LAGGARD_NAMES)]
+    rest = len(user_ids) - len(names)
+    return ", ".join(names) + (f" и ещё {rest}" if rest > 0 else "")
+
+
+# Статистика группы (только для админа)
+@cb.handler(cb.GroupStatsCallback)
+async def group_stats(callback: CallbackQuery, callback_data: cb.GroupStatsCallback):
+    """Сколько участников заполнили пожелания и загрузили QR-коды, кто отстаёт"""
+    invite_code = callback_data.code
+    group = db.get_group(invite_code)
+
+    if not group:
+        await callback.answer("❌ Группа не найдена", show_alert=True)
+        return
+
+    if group.admin_id != callback.from_user.id:
+        await callback.answer("❌ Статистика доступна только администратору", show_alert=True)
+        return
+
+    # Счётчики и отстающие поддерживаются при изменениях группы, а не пересчитываются здесь
+    participants_count = len(group.participants)
+    lines = [
+        f"📊 <b>Статистика группы \"{html.escape(group.name)}\"</b>\n",
+        f"👥 Участников: {participants_count}",
+        f"🎁 Заполнили пожелания: {group.wishlist_count} из {participants_count} "
+        f"({_percent(group.wishlist_count, participants_count)})"
+    ]
+    if group.is_distributed:
+        givers_count = len(group.assignments)
+        lines.append(
+            f"📱 Загрузили QR-код: {group.qr_count} из {givers_count} ({_percent(group.qr_count, givers_count)})"
+        )
+
+    without_wishlist, without_qr = group.laggards()
+    if without_wishlist or (group.is_distributed and without_qr):
+        lines.append("\n⏳ <b>Отстают:</b>")
+    if without_wishlist:
+        lines.append(f"Без пожеланий: {_names(group, without_wishlist)}")
+    if group.is_distributed and without_qr:
+        lines.append(f"Без QR-кода: {_names(group, without_qr)}")
+
+    await edit_message(
+        callback,
+        "\n".join(lines),
+        reply_markup=kb.back_to_group(invite_code),
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+# Импорт участников (только для админа)
+@cb.handler(cb.ImportCallback)
+async def import_participants_start(callback: CallbackQuery, state: FSMContext, callback_data: cb.ImportCallback):
+    """Начало импорта участников из CSV"""
+    invite_code = callback_data.code
+    group = db.get_group(invite_code)
+
+    if not group:
+        await callback.answer("❌ Группа не найдена", show_alert=True)
+        return
+
+    if group.admin_id != callback.from_user.id:
+        await callback.answer("❌ Только администратор может импортировать участников", show_alert=True)
+        return
+
+    if group.is_distributed:
+        await callback.answer("❌ После распределения нельзя добавлять участников", show_alert=True)
+        return
+
+    await edit_message(
+        callback,
+        "📥 <b>Импорт участников</b>\n\n"
+        "Отправьте CSV-файл со столбцами:\n"
+        "<code>user_id,first_name,username</code>\n\n"
+        "• <b>user_id</b> — числовой Telegram ID участника\n"
+        "• <b>first_name</b> — имя, которое увидят другие участники\n"
+        "• <b>username</b> — необязательно\n\n"
+        "Участники, которые уже есть в группе, будут пропущены.",
+        reply_markup=kb.cancel_action(cb.GroupInfoCallback(code=invite_code).pack()),
+        parse_mode="HTML"
+    )
+
+    await state.update_data(group_code=invite_code)
+    await state.set_state(ImportStates.waiting_for_file)
+    await callback.answer()
+
+
+@router.message(ImportStates.waiting_for_file, F.document)
+async def import_participants_file(message: Message, state: FSMContext, bot: Bot):
+    """Обработка CSV-файла с участниками"""
+    data = await state.get_data()
+    invite_code = data.get("group_code")
+    cancel_markup = kb.cancel_action(cb.GroupInfoCallback(code=invite_code).pack())
+
+    if message.document.file_size and message.document.file_size > MAX_IMPORT_FILE_SIZE:
+        await message.answer("❌ Файл слишком большой. Максимум 1 МБ.", reply_markup=cancel_markup)
+        return
+
+    buffer = io.BytesIO()
+    with span("bot.download"):
+        await bot.download(message.document, destination=buffer)
+
+    try:
+        text = buffer.getvalue().decode("utf-8-sig")
+    except UnicodeDecodeError:
+        await message.answer("❌ Файл должен быть в кодировке UTF-8.", reply_markup=cancel_markup)
+        return
+
+    participants, errors, file_duplicates = parse_participants_csv(text)
+    result = db.add_participants(invite_code, participants)
+
+    if result is None:
+        await message.answer(
+            "❌ Не удалось импортировать участников. Возможно, распределение уже началось.",
+            reply_markup=kb.main_menu()
+        )
+        await state.clear()
+        return
+
+    group = db.get_group(invite_code)
+
+    # Приветствия отправляются в фоне через очередь с ограничением скорости
+    for participant in result["added"]:
+        outbox.send_message(
+            participant["user_id"],
+            f"🎅 <b>Вас добавили в группу \"{html.escape(group.name)}\"!</b>\n\n"
+            f"Укажите список пожеланий и дождитесь распределения участников.",
+            reply_markup=kb.group_info_keyboard(
+                invite_code,
+                is_admin=False,
+                is_distributed=False,
+                user_id=participant["user_id"]
+            ),
+            parse_mode="HTML"
+        )
+
+    duplicates_count = len(file_duplicates) + len(result["duplicates"])
+    report = (
+        f"📥 <b>Импорт завершён</b>\n\n"
+        f"✅ Добавлено: {len(result['added'])}\n"
+        f"🔁 Повторы (пропущены): {duplicates_count}\n"
+        f"⚠️ Ошибки: {len(errors)}\n"
+        f"👥 Всего участников: {len(group.participants)}"
+    )
+
+    if errors:
+        report += "\n\n<b>Ошибки:</b>\n" + "\n".join(
+            f"• {html.escape(error)}" for error in errors[:MAX_REPORTED_ERRORS]
+        )
+        if len(errors) > MAX_REPORTED_ERRORS:
+            report += f"\n… и ещё {len(errors) - MAX_REPORTED_ERRORS}"
+
+    await message.answer(
+        report,
+        reply_markup=kb.group_info_keyboard(
+            invite_code,
+            is_admin=True,
+            is_distributed=False,
+            user_id=message.from_user.id
+        ),
+        parse_mode="HTML"
+    )
+    await state.clear()
+
+
+@router.message(ImportStates.waiting_for_file)
+async def import_participants_invalid(message: Message, state: FSMContext):
+    """Обработка сообщения без файла"""
+    data = await state.get_data()
+    invite_code = data.get("group_code")
+
+    await message.answer(
+        "❌ Пожалуйста, отправьте CSV-файл документом.",
+        reply_markup=kb.cancel_action(cb.GroupInfoCallback(code=invite_code).pack())
+    )
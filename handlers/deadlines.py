@@ -0,0 +1,169 @@
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from aiogram import Router, F
+from aiogram.types import CallbackQuery, Message
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+import database as db
+import keyboards as kb
+import callbacks as cb
+from config import TIMEZONE_OFFSET
+from models import Group
+from render_cache import edit_message
+from distribution import SCHEDULED_DISTRIBUTION, QR_REMINDER
+from scheduler import scheduler
+
+router = Router()
+
+# Часовой пояс, в котором админ вводит и видит даты
+LOCAL_TZ = timezone(timedelta(hours=TIMEZONE_OFFSET))
+DATE_FORMAT = "%d.%m.%Y %H:%M"
+
+DEADLINE_TITLES = {
+    SCHEDULED_DISTRIBUTION: "🎲 Распределение",
+    QR_REMINDER: "⏰ Напоминание о QR-кодах"
+}
+
+
+class DeadlineStates(StatesGroup):
+    waiting_for_date = State()
+    group_code = State()
+    kind = State()
+
+
+def format_timestamp(timestamp: float) -> str:
+    """Время задания в часовом поясе админа"""
+    return datetime.fromtimestamp(timestamp, LOCAL_TZ).strftime(DATE_FORMAT)
+
+
+def parse_local_datetime(text: str) -> Optional[float]:
+    """Разбор даты «ДД.ММ.ГГГГ ЧЧ:ММ» в часовом поясе админа"""
+    try:
+        moment = datetime.strptime(text.strip(), DATE_FORMAT)
+    except ValueError:
+        return None
+    return moment.replace(tzinfo=LOCAL_TZ).timestamp()
+
+
+def deadlines_text(group: Group) -> str:
+    """Текст экрана расписания группы"""
+    lines = [f"⏰ <b>Расписание группы \"{group.name}\"</b>\n"]
+
+    for kind, title in DEADLINE_TITLES.items():
+        job = scheduler.get(kind, group.invite_code)
+        when = format_timestamp(job["run_at"]) if job else "не запланировано"
+        lines.append(f"{title}: <b>{when}</b>")
+
+    lines.append(f"\nВремя указано в поясе UTC{TIMEZONE_OFFSET:+g}.")
+    return "\n".join(lines)
+
+
+def deadlines_markup(group: Group):
+    invite_code = group.invite_code
+    scheduled = {kind: scheduler.get(kind, invite_code) is not None for kind in DEADLINE_TITLES}
+    return kb.deadlines_keyboard(invite_code, group.is_distributed, scheduled)
+
+
+def get_admin_group(callback: CallbackQuery, invite_code: str) -> Optional[Group]:
+    group = db.get_group(invite_code)
+    if group and group.admin_id == callback.from_user.id:
+        return group
+    return None
+
+
+@cb.handler(cb.DeadlinesCallback)
+async def show_deadlines(callback: CallbackQuery, state: FSMContext, callback_data: cb.DeadlinesCallback):
+    """Расписание группы (только для админа)"""
+    group = get_admin_group(callback, callback_data.code)
+    if not group:
+        await callback.answer("❌ Только администратор может управлять расписанием", show_alert=True)
+        return
+
+    await state.clear()
+    await edit_message(callback, deadlines_text(group), reply_markup=deadlines_markup(group))
+    await callback.answer()
+
+
+@cb.handler(cb.SetDeadlineCallback)
+async def set_deadline_start(callback: CallbackQuery, state: FSMContext, callback_data: cb.SetDeadlineCallback):
+    """Запрос даты для задания"""
+    invite_code = callback_data.code
+    kind = callback_data.kind
+
+    group = get_admin_group(callback, invite_code)
+    if not group:
+        await callback.answer("❌ Только администратор может управлять расписанием", show_alert=True)
+        return
+
+    if kind not in DEADLINE_TITLES:
+        await callback.answer("⚠️ Кнопка устарела. Откройте меню заново: /start", show_alert=True)
+        return
+
+    if kind == SCHEDULED_DISTRIBUTION and group.is_distributed:
+        await callback.answer("ℹ️ Распределение уже выполнено", show_alert=True)
+        return
+
+    example = format_timestamp(time.time() + 86400)
+    await edit_message(
+        callback,
+        f"{DEADLINE_TITLES[kind]}\n\n"
+        f"Введите дату и время в формате <code>ДД.ММ.ГГГГ ЧЧ:ММ</code>\n"
+        f"(например: <i>{example}</i>, пояс UTC{TIMEZONE_OFFSET:+g})",
+        reply_markup=kb.cancel_action(cb.DeadlinesCallback(code=invite_code).pack())
+    )
+
+    await state.update_data(group_code=invite_code, kind=kind)
+    await state.set_state(DeadlineStates.waiting_for_date)
+    await callback.answer()
+
+
+@router.message(DeadlineStates.waiting_for_date, F.text)
+async def set_deadline_finish(message: Message, state: FSMContext):
+    """Планирование задания на введённую дату"""
+    data = await state.get_data()
+    invite_code = data.get("group_code")
+    kind = data.get("kind")
+    cancel_markup = kb.cancel_action(cb.DeadlinesCallback(code=invite_code).pack())
+
+    run_at = parse_local_datetime(message.text)
+    if run_at is None:
+        await message.answer(
+            "❌ Не удалось разобрать дату. Формат: <code>ДД.ММ.ГГГГ ЧЧ:ММ</code>",
+            reply_markup=cancel_markup,
+            parse_mode="HTML"
+        )
+        return
+
+    if run_at <= time.time():
+        await message.answer("❌ Эта дата уже прошла. Укажите время в будущем.", reply_markup=cancel_markup)
+        return
+
+    group = db.get_group(invite_code)
+    if not group or group.admin_id != message.from_user.id:
+        await message.answer("❌ Группа не найдена", reply_markup=kb.main_menu())
+        await state.clear()
+        return
+
+    scheduler.schedule(kind, invite_code, run_at)
+    await state.clear()
+
+    await message.answer(
+        f"✅ {DEADLINE_TITLES[kind]}: <b>{format_timestamp(run_at)}</b>\n\n" + deadlines_text(group),
+        reply_markup=deadlines_markup(group),
+        parse_mode="HTML"
+    )
+
+
+@cb.handler(cb.CancelDeadlineCallback)
+async def cancel_deadline(callback: CallbackQuery, callback_data: cb.CancelDeadlineCallback):
+    """Отмена запланированного задания"""
+    group = get_admin_group(callback, callback_data.code)
+    if not group:
+        await callback.answer("❌ Только администратор может управлять расписанием", show_alert=True)
+        return
+
+    cancelled = scheduler.cancel(callback_data.kind, callback_data.code)
+
+    await edit_message(callback, deadlines_text(group), reply_markup=deadlines_markup(group))
+    await callback.answer("✅ Задание отменено" if cancelled else "ℹ️ Задание уже выполнено или отменено")
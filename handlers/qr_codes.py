@@ -1,15 +1,30 @@
+import asyncio
+import logging
+from typing import List, Sequence
 from aiogram import Router, F, Bot
-from aiogram.types import CallbackQuery, Message, FSInputFile
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, FSInputFile, InputMediaPhoto, Message, PhotoSize
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.exceptions import TelegramBadRequest
 import database as db
 import keyboards as kb
+import callbacks as cb
+from albums import AlbumCollector
+from config import QR_ALBUM_WINDOW, QR_DOWNLOAD_CONCURRENCY
+from models import QRCode
+from reads import reads
+from render_cache import edit_message
+from tracing import span
 import os
 
 router = Router()
+logger = logging.getLogger(__name__)
 
 QR_CODES_DIR = "qr_codes"
+# Больше фото в одном альбоме Telegram не принимает
+MAX_QR_CODES = 10
+
+albums = AlbumCollector(QR_ALBUM_WINDOW)
 
 
 class UploadQRStates(StatesGroup):
@@ -17,17 +32,17 @@ class UploadQRStates(StatesGroup):
     group_code = State()
 
 
-@router.callback_query(F.data.startswith("upload_qr_"))
-async def upload_qr_start(callback: CallbackQuery, state: FSMContext):
+@cb.handler(cb.UploadQRCallback)
+async def upload_qr_start(callback: CallbackQuery, state: FSMContext, callback_data: cb.UploadQRCallback):
     """Начало загрузки QR-кода дарителем"""
-    invite_code = callback.data.split("_")[-1]
+    invite_code = callback_data.code
     group = db.get_group(invite_code)
 
     if not group:
         await callback.answer("❌ Группа не найдена", show_alert=True)
         return
 
-    if not group["is_distributed"]:
+    if not group.is_distributed:
         await callback.answer("❌ Распределение ещё не началось", show_alert=True)
         return
 
@@ -41,27 +56,62 @@ async def upload_qr_start(callback: CallbackQuery, state: FSMContext):
     has_qr = db.has_qr_code(invite_code, callback.from_user.id)
     action_text = "заменить" if has_qr else "загрузить"
 
-    try:
-        await callback.message.edit_text(
-            f"📤 <b>Загрузка QR-кода</b>\n\n"
-            f"Отправьте фото QR-кода для получения подарка в пункте выдачи заказов.\n\n"
-            f"Этот QR-код будет доступен получателю вашего подарка.\n\n"
-            f"{'⚠️ Внимание: текущий QR-код будет заменён новым.' if has_qr else ''}",
-            reply_markup=kb.cancel_action(f"group_info_{invite_code}"),
-            parse_mode="HTML"
-        )
-    except TelegramBadRequest as e:
-        if "message is not modified" not in str(e):
-            raise
+    await edit_message(
+        callback,
+        f"📤 <b>Загрузка QR-кода</b>\n\n"
+        f"Отправьте фото QR-кода для получения подарка в пункте выдачи заказов. "
+        f"Если посылок несколько, отправьте все QR-коды одним альбомом.\n\n"
+        f"Этот QR-код будет доступен получателю вашего подарка.\n\n"
+        f"{'⚠️ Внимание: текущие QR-коды будут заменены новыми.' if has_qr else ''}",
+        reply_markup=kb.cancel_action(cb.GroupInfoCallback(code=invite_code).pack()),
+        parse_mode="HTML"
+    )
 
     await state.update_data(group_code=invite_code)
     await state.set_state(UploadQRStates.waiting_for_photo)
     await callback.answer()
 
 
+async def _download_qr_code(bot: Bot, photo: PhotoSize, file_path: str, slots: asyncio.Semaphore) -> QRCode:
+    """Скачивание одного фото, когда освободится место среди одновременных загрузок"""
+    async with slots:
+        file = await bot.get_file(photo.file_id)
+        # Скачивание файла идёт мимо сессии, поэтому отрезок ставится вручную
+        with span("bot.download_file"):
+            await bot.download_file(file.file_path, file_path)
+    return QRCode(path=file_path, file_id=photo.file_id)
+
+
+async def download_qr_codes(bot: Bot, invite_code: str, user_id: int, photos: List[PhotoSize]) -> List[QRCode]:
+    """Параллельное скачивание фото альбома. При ошибке уже скачанные файлы удаляются"""
+    # Уникальный ID фото в имени: новые файлы не затирают старые, пока замена не сохранена
+    file_paths = [
+        os.path.join(QR_CODES_DIR, f"{invite_code}_{user_id}_{photo.file_unique_id}.jpg") for photo in photos
+    ]
+    # Фото одного альбома скачиваются параллельно, но не больше QR_DOWNLOAD_CONCURRENCY сразу
+    slots = asyncio.Semaphore(QR_DOWNLOAD_CONCURRENCY)
+    results = await asyncio.gather(
+        *(_download_qr_code(bot, photo, file_path, slots) for photo, file_path in zip(photos, file_paths)),
+        return_exceptions=True
+    )
+
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        for result in results:
+            if isinstance(result, QRCode):
+                db.delete_qr_code_file(result.path)
+        raise errors[0]
+    return results
+
+
 @router.message(UploadQRStates.waiting_for_photo, F.photo)
 async def upload_qr_photo(message: Message, state: FSMContext, bot: Bot):
-    """Обработка загруженного фото QR-кода"""
+    """Обработка загруженного фото QR-кода или альбома фото"""
+    album = await albums.collect(message)
+    if album is None:
+        # Фото из альбома, который обработает его первое сообщение
+        return
+
     data = await state.get_data()
     invite_code = data.get("group_code")
 
@@ -77,73 +127,66 @@ async def upload_qr_photo(message: Message, state: FSMContext, bot: Bot):
         return
 
     try:
-        # Получаем фото (берем самое качественное - последнее в списке)
-        photo = message.photo[-1]
-
-        # Создаём имя файла
-        file_name = f"{invite_code}_{message.from_user.id}.jpg"
-        file_path = os.path.join(QR_CODES_DIR, file_name)
+        # Из каждого фото берём самое качественное - последнее в списке размеров
+        photos = [album_message.photo[-1] for album_message in album if album_message.photo][:MAX_QR_CODES]
 
-        # Проверяем существует ли старый QR-код и удаляем его
-        old_qr_path = None
+        # Запоминаем старые QR-коды, чтобы удалить их после замены
+        old_qr_paths = []
         if db.has_qr_code(invite_code, message.from_user.id):
             recipient = db.get_recipient(message.from_user.id, invite_code)
-            if recipient and recipient.get("qr_code_path"):
-                old_qr_path = recipient["qr_code_path"]
+            if recipient:
+                old_qr_paths = recipient["qr_code_paths"]
 
-        # Скачиваем файл
-        file = await bot.get_file(photo.file_id)
-        await bot.download_file(file.file_path, file_path)
+        qr_codes = await download_qr_codes(bot, invite_code, message.from_user.id, photos)
 
-        # Удаляем старый QR-код если был
-        if old_qr_path and old_qr_path != file_path:
-            db.delete_qr_code_file(old_qr_path)
+        # Сохраняем QR-коды в базе данных
+        success = db.save_qr_codes(invite_code, message.from_user.id, qr_codes)
 
-        # Сохраняем путь к файлу в базе данных
-        success = db.save_qr_code_path(invite_code, message.from_user.id, file_path)
+        # Удаляем заменённые QR-коды, а если сохранить не удалось — только что скачанные
+        new_paths = [qr_code.path for qr_code in qr_codes]
+        stale_paths = [path for path in old_qr_paths if path not in new_paths] if success else new_paths
+        for path in stale_paths:
+            db.delete_qr_code_file(path)
 
         if success:
             # Отправляем уведомление получателю подарка
             try:
-                assignment = group["assignments"][str(message.from_user.id)]
-
-                # Обратная совместимость: если assignment это строка (старый формат)
-                if isinstance(assignment, str):
-                    receiver_id = assignment
-                else:
-                    receiver_id = assignment["receiver_id"]
-
-                receiver_info = group["participants"][receiver_id]
+                receiver_id = group.assignments[message.from_user.id].receiver_id
 
                 await bot.send_message(
-                    chat_id=int(receiver_id),
+                    chat_id=receiver_id,
                     text=f"🔔 <b>Уведомление</b>\n\n"
-                         f"В группе <b>\"{group['name']}\"</b> ваш Тайный Санта загрузил QR-код!\n\n"
+                         f"В группе <b>\"{group.name}\"</b> ваш Тайный Санта загрузил QR-код!\n\n"
                          f"📱 Теперь вы можете посмотреть QR-код для получения подарка в пункте выдачи.",
                     reply_markup=kb.group_info_keyboard(
                         invite_code,
-                        is_admin=group["admin_id"] == int(receiver_id),
+                        is_admin=group.admin_id == receiver_id,
                         is_distributed=True,
-                        user_id=int(receiver_id),
-                        has_qr_code=db.has_qr_code(invite_code, int(receiver_id)),
+                        user_id=receiver_id,
+                        has_qr_code=db.has_qr_code(invite_code, receiver_id),
                         recipient_has_qr=True
                     ),
                     parse_mode="HTML"
                 )
             except Exception as e:
-                print(f"Не удалось отправить уведомление получателю: {e}")
+                logger.warning("Не удалось отправить уведомление получателю: %s", e)
 
             # Проверяем информацию о QR-кодах для кнопок
             has_qr_code = db.has_qr_code(invite_code, message.from_user.id)
-            qr_path = db.get_qr_code_for_recipient(invite_code, message.from_user.id)
-            recipient_has_qr = qr_path is not None
+            recipient_has_qr = bool(db.get_qr_codes_for_recipient(invite_code, message.from_user.id))
+
+            if len(qr_codes) > 1:
+                title = f"✅ <b>QR-коды успешно загружены ({len(qr_codes)})!</b>"
+            else:
+                title = "✅ <b>QR-код успешно загружен!</b>"
 
             await message.answer(
-                f"✅ <b>QR-код успешно загружен!</b>\n\n"
-                f"Получатель вашего подарка сможет использовать этот QR-код для получения посылки в ПВЗ.",
+                f"{title}\n\n"
+                f"Получатель вашего подарка сможет использовать {'эти QR-коды' if len(qr_codes) > 1 else 'этот QR-код'} "
+                f"для получения посылки в ПВЗ.",
                 reply_markup=kb.group_info_keyboard(
                     invite_code,
-                    is_admin=group["admin_id"] == message.from_user.id,
+                    is_admin=group.admin_id == message.from_user.id,
                     is_distributed=True,
                     user_id=message.from_user.id,
                     has_qr_code=has_qr_code,
@@ -158,18 +201,17 @@ async def upload_qr_photo(message: Message, state: FSMContext, bot: Bot):
             )
 
     except Exception as e:
-        print(f"Ошибка при загрузке QR-кода: {e}")
+        logger.exception("Ошибка при загрузке QR-кода: %s", e)
 
         # Проверяем информацию о QR-кодах для кнопок
         has_qr_code = db.has_qr_code(invite_code, message.from_user.id)
-        qr_path = db.get_qr_code_for_recipient(invite_code, message.from_user.id)
-        recipient_has_qr = qr_path is not None
+        recipient_has_qr = bool(db.get_qr_codes_for_recipient(invite_code, message.from_user.id))
 
         await message.answer(
             "❌ Ошибка при загрузке QR-кода. Попробуйте ещё раз.",
             reply_markup=kb.group_info_keyboard(
                 invite_code,
-                is_admin=group["admin_id"] == message.from_user.id,
+                is_admin=group.admin_id == message.from_user.id,
                 is_distributed=True,
                 user_id=message.from_user.id,
                 has_qr_code=has_qr_code,
@@ -189,28 +231,28 @@ async def upload_qr_invalid(message: Message, state: FSMContext):
     await message.answer(
         "❌ Пожалуйста, отправьте фото QR-кода.\n\n"
         "Убедитесь, что вы отправляете изображение, а не файл.",
-        reply_markup=kb.cancel_action(f"group_info_{invite_code}")
+        reply_markup=kb.cancel_action(cb.GroupInfoCallback(code=invite_code).pack())
     )
 
 
-@router.callback_query(F.data.startswith("view_qr_"))
-async def view_qr_code(callback: CallbackQuery):
+@cb.handler(cb.ViewQRCallback)
+async def view_qr_code(callback: CallbackQuery, callback_data: cb.ViewQRCallback):
     """Просмотр QR-кода получателем"""
-    invite_code = callback.data.split("_")[-1]
-    group = db.get_group(invite_code)
+    invite_code = callback_data.code
+    group = await reads.get_group(invite_code)
 
     if not group:
         await callback.answer("❌ Группа не найдена", show_alert=True)
         return
 
-    if not group["is_distributed"]:
+    if not group.is_distributed:
         await callback.answer("❌ Распределение ещё не началось", show_alert=True)
         return
 
-    # Получаем QR-код (находим кто дарит подарок этому пользователю)
-    qr_code_path = db.get_qr_code_for_recipient(invite_code, callback.from_user.id)
+    # Получаем QR-коды (находим кто дарит подарок этому пользователю)
+    qr_codes = db.get_qr_codes_for_recipient(invite_code, callback.from_user.id)
 
-    if not qr_code_path:
+    if not qr_codes:
         await callback.answer(
             "❌ QR-код ещё не загружен вашим Тайным Сантой.\n\n"
             "Подождите, пока даритель загрузит QR-код.",
@@ -218,23 +260,59 @@ async def view_qr_code(callback: CallbackQuery):
         )
         return
 
-    # Проверяем существует ли файл
-    if not os.path.exists(qr_code_path):
+    # Проверяем, что фото можно отправить: по ID в Telegram или из файла
+    if any(not qr_code.file_id and not os.path.exists(qr_code.path) for qr_code in qr_codes):
         await callback.answer("❌ Файл QR-кода не найден", show_alert=True)
         return
 
+    caption = (
+        f"📱 <b>{'QR-коды' if len(qr_codes) > 1 else 'QR-код'} для получения подарка</b>\n\n"
+        f"Используйте {'эти QR-коды' if len(qr_codes) > 1 else 'этот QR-код'} для получения вашего подарка "
+        f"в пункте выдачи заказов.\n\n"
+        f"Группа: {group.name}"
+    )
+
+    from_files = False
     try:
-        # Отправляем фото с QR-кодом
-        photo = FSInputFile(qr_code_path)
-        await callback.message.answer_photo(
-            photo=photo,
-            caption=f"📱 <b>QR-код для получения подарка</b>\n\n"
-                    f"Используйте этот QR-код для получения вашего подарка в пункте выдачи заказов.\n\n"
-                    f"Группа: {group['name']}",
-            parse_mode="HTML"
-        )
-        await callback.answer("✅ QR-код отправлен")
+        try:
+            sent = await send_qr_codes(callback.message, qr_codes, caption, from_files=False)
+        except TelegramBadRequest:
+            # Сохранённый ID фото отклонён — отправляем из файлов
+            if not any(qr_code.file_id for qr_code in qr_codes) or not all(
+                os.path.exists(qr_code.path) for qr_code in qr_codes
+            ):
+                raise
+            from_files = True
+            sent = await send_qr_codes(callback.message, qr_codes, caption, from_files=True)
+        await callback.answer("✅ QR-коды отправлены" if len(qr_codes) > 1 else "✅ QR-код отправлен")
 
     except Exception as e:
-        print(f"Ошибка при отправке QR-кода: {e}")
+        logger.exception("Ошибка при отправке QR-кода: %s", e)
         await callback.answer("❌ Ошибка при отправке QR-кода", show_alert=True)
+        return
+
+    # Фото, загруженные из файлов, дальше отправляются по ID без повторной загрузки
+    file_ids = {
+        qr_code.path: message.photo[-1].file_id
+        for qr_code, message in zip(qr_codes, sent)
+        if message.photo and (from_files or not qr_code.file_id)
+    }
+    giver_id = db.get_giver_id(invite_code, callback.from_user.id)
+    if file_ids and giver_id is not None:
+        db.set_qr_file_ids(invite_code, giver_id, file_ids)
+
+
+async def send_qr_codes(message: Message, qr_codes: Sequence[QRCode], caption: str, from_files: bool) -> List[Message]:
+    """Отправка QR-кодов одним сообщением: фото или альбом (подпись у первого фото)"""
+    photos = [
+        FSInputFile(qr_code.path) if from_files or not qr_code.file_id else qr_code.file_id
+        for qr_code in qr_codes
+    ]
+    if len(photos) == 1:
+        return [await message.answer_photo(photo=photos[0], caption=caption, parse_mode="HTML")]
+
+    media = [
+        InputMediaPhoto(media=photo, caption=caption if index == 0 else None, parse_mode="HTML")
+        for index, photo in enumerate(photos)
+    ]
+    return await message.answer_media_group(media=media)
@@ -0,0 +1,137 @@
+import html
+import logging
+from aiogram import Router, F
+from aiogram.types import CallbackQuery, Message
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+import database as db
+import keyboards as kb
+import callbacks as cb
+from config import RELAY_LOG_SIZE
+from outbox import outbox
+from render_cache import edit_message
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+# Максимальная длина сообщения и сколько последних сообщений показывать перед вводом
+MAX_MESSAGE_LENGTH = 1000
+HISTORY_SIZE = 5
+
+
+class RelayStates(StatesGroup):
+    waiting_for_message = State()
+
+
+def _history(invite_code: str, giver_id: int, viewer_is_giver: bool) -> str:
+    """Последние сообщения переписки с точки зрения одного из собеседников"""
+    lines = []
+    for message in db.get_relay_messages(invite_code, giver_id, HISTORY_SIZE):
+        # Сообщение к дарителю написал получатель, и наоборот
+        if message.to_giver != viewer_is_giver:
+            author = "Вы"
+        else:
+            author = "Получатель" if viewer_is_giver else "Санта"
+        lines.append(f"<b>{author}:</b> {html.escape(message.text)}")
+    return "\n".join(lines)
+
+
+async def _start(callback: CallbackQuery, state: FSMContext, invite_code: str, to_giver: bool):
+    group = db.get_group(invite_code)
+
+    if not group:
+        await callback.answer("❌ Группа не найдена", show_alert=True)
+        return
+
+    if not group.is_distributed:
+        await callback.answer("❌ Распределение ещё не началось", show_alert=True)
+        return
+
+    user_id = callback.from_user.id
+    giver_id = group.giver_of(user_id) if to_giver else user_id
+    if giver_id is None or giver_id not in group.assignments:
+        await callback.answer("❌ Вы не участвуете в этой группе", show_alert=True)
+        return
+
+    history = _history(invite_code, giver_id, viewer_is_giver=not to_giver)
+    history_text = f"<b>Последние сообщения:</b>\n{history}\n\n" if history else ""
+    counterpart = "вашему Тайному Санте" if to_giver else "получателю вашего подарка"
+
+    await edit_message(
+        callback,
+        f"✉️ <b>Анонимное сообщение</b>\n\n"
+        f"{history_text}"
+        f"Напишите сообщение {counterpart}. Бот передаст его, не раскрывая ваше имя.",
+        reply_markup=kb.cancel_action(cb.GroupInfoCallback(code=invite_code).pack()),
+        parse_mode="HTML"
+    )
+
+    await state.update_data(group_code=invite_code, to_giver=to_giver)
+    await state.set_state(RelayStates.waiting_for_message)
+    await callback.answer()
+
+
+@cb.handler(cb.WriteSantaCallback)
+async def write_santa(callback: CallbackQuery, state: FSMContext, callback_data: cb.WriteSantaCallback):
+    """Начало сообщения получателя своему Тайному Санте"""
+    await _start(callback, state, callback_data.code, to_giver=True)
+
+
+@cb.handler(cb.WriteRecipientCallback)
+async def write_recipient(callback: CallbackQuery, state: FSMContext, callback_data: cb.WriteRecipientCallback):
+    """Начало сообщения дарителя своему получателю"""
+    await _start(callback, state, callback_data.code, to_giver=False)
+
+
+@router.message(RelayStates.waiting_for_message, F.text)
+async def relay_message(message: Message, state: FSMContext):
+    """Передача сообщения собеседнику через очередь уведомлений"""
+    data = await state.get_data()
+    invite_code = data.get("group_code")
+    to_giver = data.get("to_giver", False)
+
+    text = message.text.strip()
+    if len(text) > MAX_MESSAGE_LENGTH:
+        await message.answer(
+            f"❌ Сообщение слишком длинное. Максимум {MAX_MESSAGE_LENGTH} символов.",
+            reply_markup=kb.cancel_action(cb.GroupInfoCallback(code=invite_code).pack())
+        )
+        return
+
+    recipient_id = db.add_relay_message(invite_code, message.from_user.id, to_giver, text, RELAY_LOG_SIZE)
+    await state.clear()
+
+    if recipient_id is None:
+        await message.answer(
+            "❌ Не удалось отправить сообщение: распределение изменилось.",
+            reply_markup=kb.main_menu()
+        )
+        return
+
+    group = db.get_group(invite_code)
+    author = "Получатель вашего подарка" if to_giver else "Ваш Тайный Санта"
+    # Отправка через очередь: общий лимит скорости и повтор после 429 берёт на себя она и сессия
+    outbox.send_message(
+        recipient_id,
+        f"✉️ <b>{author} в группе \"{html.escape(group.name)}\" пишет:</b>\n\n{html.escape(text)}",
+        reply_markup=kb.relay_reply(invite_code, to_giver=not to_giver),
+        parse_mode="HTML"
+    )
+    logger.info("Анонимное сообщение поставлено в очередь: группа %s", invite_code)
+
+    await message.answer(
+        "✅ Сообщение отправлено. Ваше имя собеседник не увидит.",
+        reply_markup=kb.back_to_group(invite_code)
+    )
+
+
+@router.message(RelayStates.waiting_for_message)
+async def relay_message_invalid(message: Message, state: FSMContext):
+    """Обработка сообщения без текста"""
+    data = await state.get_data()
+    invite_code = data.get("group_code")
+
+    await message.answer(
+        "❌ Через бота можно передать только текст.",
+        reply_markup=kb.cancel_action(cb.GroupInfoCallback(code=invite_code).pack())
+    )
@@ -1,27 +1,49 @@
-from aiogram import Router, F, Bot
+from aiogram import Router
 from aiogram.types import CallbackQuery
-from aiogram.exceptions import TelegramBadRequest
 import database as db
 import keyboards as kb
+import callbacks as cb
+from models import DELIVERY_PENDING, Group
+from reads import reads
+from render_cache import edit_message
+from distribution import NOTIFY_ASSIGNMENTS, SCHEDULED_DISTRIBUTION, start_notifications
+from scheduler import scheduler
 
 router = Router()
 
 
-@router.callback_query(F.data.startswith("start_distribution_"))
-async def start_distribution_confirm(callback: CallbackQuery):
+async def show_distribution_confirm(callback: CallbackQuery, invite_code: str, group: Group):
+    """Экран подтверждения распределения для текущего списка участников"""
+    await edit_message(
+        callback,
+        f"🎲 <b>Начать распределение?</b>\n\n"
+        f"📝 Группа: {group.name}\n"
+        f"👥 Участников: {len(group.participants)}\n\n"
+        f"⚠️ <b>Внимание!</b> После распределения:\n"
+        f"• Нельзя будет добавить новых участников\n"
+        f"• Каждый участник получит сообщение с именем того, кому нужно подарить подарок\n"
+        f"• Вы можете отменить распределение и сделать его заново\n\n"
+        f"Вы уверены?",
+        reply_markup=kb.confirm_distribution(invite_code, group.roster_version),
+        parse_mode="HTML"
+    )
+
+
+@cb.handler(cb.StartDistributionCallback)
+async def start_distribution_confirm(callback: CallbackQuery, callback_data: cb.StartDistributionCallback):
     """Подтверждение начала распределения"""
-    invite_code = callback.data.split("_")[-1]
+    invite_code = callback_data.code
     group = db.get_group(invite_code)
 
     if not group:
         await callback.answer("❌ Группа не найдена", show_alert=True)
         return
 
-    if group["admin_id"] != callback.from_user.id:
+    if group.admin_id != callback.from_user.id:
         await callback.answer("❌ Только администратор может начать распределение", show_alert=True)
         return
 
-    participants_count = len(group["participants"])
+    participants_count = len(group.participants)
 
     if participants_count < 3:
         await callback.answer(
@@ -32,163 +54,165 @@ async def start_distribution_confirm(callback: CallbackQuery):
         )
         return
 
-    try:
-        await callback.message.edit_text(
-            f"🎲 <b>Начать распределение?</b>\n\n"
-            f"📝 Группа: {group['name']}\n"
-            f"👥 Участников: {participants_count}\n\n"
-            f"⚠️ <b>Внимание!</b> После распределения:\n"
-            f"• Нельзя будет добавить новых участников\n"
-            f"• Каждый участник получит сообщение с именем того, кому нужно подарить подарок\n"
-            f"• Вы можете отменить распределение и сделать его заново\n\n"
-            f"Вы уверены?",
-            reply_markup=kb.confirm_distribution(invite_code),
-            parse_mode="HTML"
-        )
-    except TelegramBadRequest as e:
-        if "message is not modified" not in str(e):
-            raise
-
+    await show_distribution_confirm(callback, invite_code, group)
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("confirm_dist_"))
-async def confirm_distribution(callback: CallbackQuery):
+@cb.handler(cb.ConfirmDistributionCallback, single_flight=True)
+async def confirm_distribution(callback: CallbackQuery, callback_data: cb.ConfirmDistributionCallback):
     """Подтверждение и выполнение распределения"""
-    invite_code = callback.data.split("_")[-1]
+    invite_code = callback_data.code
     group = db.get_group(invite_code)
 
     if not group:
         await callback.answer("❌ Группа не найдена", show_alert=True)
         return
 
-    if group["admin_id"] != callback.from_user.id:
+    if group.admin_id != callback.from_user.id:
         await callback.answer("❌ Только администратор может начать распределение", show_alert=True)
         return
 
-    # Выполняем распределение
-    success = db.distribute_santa(invite_code)
+    # Выполняем распределение того списка участников, который подтвердил админ
+    try:
+        group = db.distribute_santa(invite_code, expected_roster=callback_data.roster)
+    except db.VersionConflict:
+        group = db.get_group(invite_code)
+        if not group:
+            await callback.answer("❌ Группа не найдена", show_alert=True)
+            return
+
+        if group.is_distributed:
+            await callback.answer("ℹ️ Распределение уже выполнено", show_alert=True)
+            return
+
+        await show_distribution_confirm(callback, invite_code, group)
+        await callback.answer(
+            "⚠️ Группа изменилась, пока вы подтверждали.\n"
+            "Проверьте данные и подтвердите ещё раз.",
+            show_alert=True
+        )
+        return
 
-    if not success:
+    if not group:
         await callback.answer("❌ Ошибка при распределении", show_alert=True)
         return
 
-    # Получаем обновлённые данные группы
-    group = db.get_group(invite_code)
+    # Ручное распределение заменяет запланированное
+    scheduler.cancel(SCHEDULED_DISTRIBUTION, invite_code)
 
-    # Отправляем уведомления всем участникам
-    bot: Bot = callback.bot
-    success_count = 0
-    failed_users = []
-
-    for giver_id, assignment in group["assignments"].items():
-        giver_info = group["participants"][giver_id]
-        try:
-            # Обратная совместимость: если assignment это строка (старый формат)
-            if isinstance(assignment, str):
-                receiver_id = assignment
-            else:
-                receiver_id = assignment["receiver_id"]
-
-            recipient_info = group["participants"][receiver_id]
-
-            username_text = f"@{recipient_info['username']}" if recipient_info['username'] else ""
-            wishlist_text = f"\n\n🎁 <b>Пожелания:</b>\n{recipient_info['wishlist']}" if recipient_info['wishlist'] else "\n\n(Список пожеланий пока не указан)"
-
-            await bot.send_message(
-                chat_id=int(giver_id),
-                text=f"🎅 <b>Распределение в группе \"{group['name']}\" завершено!</b>\n\n"
-                     f"🎁 Вы дарите подарок:\n"
-                     f"👤 <b>{recipient_info['first_name']}</b> {username_text}"
-                     f"{wishlist_text}\n\n"
-                     f"Сохраните эту информацию в секрете! 🤫",
-                parse_mode="HTML"
-            )
-            success_count += 1
-        except Exception as e:
-            failed_users.append(giver_info['first_name'])
-            print(f"Не удалось отправить сообщение пользователю {giver_id}: {e}")
-
-    # Информируем админа о результатах
-    result_text = f"✅ <b>Распределение завершено!</b>\n\n" \
-                  f"📊 Уведомления отправлены: {success_count}/{len(group['assignments'])}\n"
-
-    if failed_users:
-        result_text += f"\n⚠️ Не удалось отправить сообщения:\n" + "\n".join([f"• {name}" for name in failed_users])
-        result_text += "\n\nПопросите этих участников написать боту /start"
+    # Распределение должно быть на диске до того, как участники узнают получателей
+    await db.wait_durable()
+
+    # Уведомления рассылает задание планировщика: оно переживёт перезапуск бота
+    start_notifications(invite_code)
 
     # Получаем информацию о QR-кодах для админа
     has_qr_code = db.has_qr_code(invite_code, callback.from_user.id)
-    qr_path = db.get_qr_code_for_recipient(invite_code, callback.from_user.id)
-    recipient_has_qr = qr_path is not None
-
-    try:
-        await callback.message.edit_text(
-            result_text,
-            reply_markup=kb.group_info_keyboard(
-                invite_code,
-                is_admin=True,
-                is_distributed=True,
-                user_id=callback.from_user.id,
-                has_qr_code=has_qr_code,
-                recipient_has_qr=recipient_has_qr
-            ),
-            parse_mode="HTML"
-        )
-    except TelegramBadRequest as e:
-        if "message is not modified" not in str(e):
-            raise
+    recipient_has_qr = bool(db.get_qr_codes_for_recipient(invite_code, callback.from_user.id))
+
+    await edit_message(
+        callback,
+        f"✅ <b>Распределение выполнено!</b>\n\n"
+        f"📨 Участники получают сообщения с именами получателей.\n"
+        f"Отчёт о рассылке придёт отдельным сообщением.",
+        reply_markup=kb.group_info_keyboard(
+            invite_code,
+            is_admin=True,
+            is_distributed=True,
+            user_id=callback.from_user.id,
+            has_qr_code=has_qr_code,
+            recipient_has_qr=recipient_has_qr
+        ),
+        parse_mode="HTML"
+    )
 
     await callback.answer("🎉 Распределение завершено!")
 
 
-@router.callback_query(F.data.startswith("cancel_distribution_"))
-async def cancel_distribution(callback: CallbackQuery):
+@cb.handler(cb.CancelDistributionCallback, single_flight=True)
+async def cancel_distribution(callback: CallbackQuery, callback_data: cb.CancelDistributionCallback):
     """Отмена распределения"""
-    invite_code = callback.data.split("_")[-1]
+    invite_code = callback_data.code
     group = db.get_group(invite_code)
 
     if not group:
         await callback.answer("❌ Группа не найдена", show_alert=True)
         return
 
-    if group["admin_id"] != callback.from_user.id:
+    if group.admin_id != callback.from_user.id:
         await callback.answer("❌ Только администратор может отменить распределение", show_alert=True)
         return
 
     # Отменяем распределение
     db.cancel_distribution(invite_code)
 
-    try:
-        await callback.message.edit_text(
-            f"🔄 <b>Распределение отменено</b>\n\n"
-            f"Вы можете запустить распределение заново.",
-            reply_markup=kb.group_info_keyboard(
-                invite_code,
-                is_admin=True,
-                is_distributed=False,
-                user_id=callback.from_user.id
-            ),
-            parse_mode="HTML"
-        )
-    except TelegramBadRequest as e:
-        if "message is not modified" not in str(e):
-            raise
+    # Недоставленные уведомления об отменённом распределении больше не нужны
+    scheduler.cancel(NOTIFY_ASSIGNMENTS, invite_code)
+
+    await edit_message(
+        callback,
+        f"🔄 <b>Распределение отменено</b>\n\n"
+        f"Вы можете запустить распределение заново.",
+        reply_markup=kb.group_info_keyboard(
+            invite_code,
+            is_admin=True,
+            is_distributed=False,
+            user_id=callback.from_user.id
+        ),
+        parse_mode="HTML"
+    )
 
     await callback.answer("✅ Распределение отменено")
 
 
-@router.callback_query(F.data.startswith("my_recipient_"))
-async def show_my_recipient(callback: CallbackQuery):
-    """Показать информацию о получателе подарка"""
-    invite_code = callback.data.split("_")[-1]
+@cb.handler(cb.RetryNotificationsCallback, single_flight=True)
+async def retry_notifications(callback: CallbackQuery, callback_data: cb.RetryNotificationsCallback):
+    """Повторная отправка уведомлений, которые не удалось доставить"""
+    invite_code = callback_data.code
     group = db.get_group(invite_code)
 
     if not group:
         await callback.answer("❌ Группа не найдена", show_alert=True)
         return
 
-    if not group["is_distributed"]:
+    if group.admin_id != callback.from_user.id:
+        await callback.answer("❌ Только администратор может отправить уведомления", show_alert=True)
+        return
+
+    if not group.is_distributed:
+        await callback.answer("❌ Распределение отменено", show_alert=True)
+        return
+
+    # Неудачные уведомления и те, до которых рассылка не дошла (например, прерванная)
+    retry_count = db.reset_failed_deliveries(invite_code) + len(group.givers_with_delivery(DELIVERY_PENDING))
+    if not retry_count:
+        await callback.answer("ℹ️ Неотправленных уведомлений нет")
+        return
+
+    start_notifications(invite_code)
+
+    await edit_message(
+        callback,
+        f"🔁 <b>Повторная отправка уведомлений</b>\n\n"
+        f"📨 Получателей: {retry_count}\n"
+        f"Отчёт о рассылке придёт отдельным сообщением.",
+        reply_markup=kb.back_to_group(invite_code),
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+@cb.handler(cb.MyRecipientCallback)
+async def show_my_recipient(callback: CallbackQuery, callback_data: cb.MyRecipientCallback):
+    """Показать информацию о получателе подарка"""
+    invite_code = callback_data.code
+    group = await reads.get_group(invite_code)
+
+    if not group:
+        await callback.answer("❌ Группа не найдена", show_alert=True)
+        return
+
+    if not group.is_distributed:
         await callback.answer("❌ Распределение ещё не началось", show_alert=True)
         return
 
@@ -1,14 +1,28 @@
-from aiogram import Router, F
-from aiogram.filters import Command
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
 from keyboards import main_menu
+from .groups import join_by_code
+import callbacks as cb
+from render_cache import edit_message
 
 router = Router()
 
 
 @router.message(Command("start"))
-async def cmd_start(message: Message):
-    """Обработчик команды /start"""
+async def cmd_start(message: Message, command: CommandObject, state: FSMContext):
+    """Обработчик команды /start (в том числе по пригласительной ссылке)"""
+    # Ссылка вида t.me/<бот>?start=<код> сразу добавляет в группу
+    if command.args:
+        await state.clear()
+        if not await join_by_code(message, command.args.strip().lower()):
+            await message.answer(
+                "❌ Пригласительная ссылка недействительна: группа не найдена.",
+                reply_markup=main_menu()
+            )
+        return
+
     await message.answer(
         f"🎅 <b>Добро пожаловать в бота Тайный Санта!</b>\n\n"
         f"Привет, {message.from_user.first_name}!\n\n"
@@ -24,10 +38,11 @@ async def cmd_start(message: Message):
     )
 
 
-@router.callback_query(F.data == "back_to_menu")
+@cb.handler(cb.MainMenuCallback)
 async def back_to_menu(callback: CallbackQuery):
     """Возврат в главное меню"""
-    await callback.message.edit_text(
+    await edit_message(
+        callback,
         f"🎅 <b>Главное меню</b>\n\n"
         f"Выберите действие:",
         reply_markup=main_menu(),
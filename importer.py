@@ -0,0 +1,61 @@
+import csv
+import io
+import re
+from typing import Dict, List, Tuple
+
+MAX_NAME_LENGTH = 64
+USERNAME_RE = re.compile(r"^[A-Za-z0-9_]{5,32}$")
+
+
+def parse_participants_csv(text: str) -> Tuple[List[Dict], List[str], List[Dict]]:
+    """Разбор CSV со столбцами user_id, first_name[, username].
+
+    Возвращает корректные строки, ошибки и повторы внутри файла.
+    """
+    participants = []
+    errors = []
+    duplicates = []
+    seen = set()
+
+    for line_number, row in enumerate(csv.reader(io.StringIO(text)), start=1):
+        cells = [cell.strip() for cell in row]
+        if not any(cells):
+            continue
+
+        # Пропускаем строку заголовка
+        if line_number == 1 and not cells[0].lstrip("-").isdigit():
+            continue
+
+        if len(cells) < 2:
+            errors.append(f"строка {line_number}: нужно минимум два столбца (user_id, имя)")
+            continue
+
+        user_id, first_name = cells[0], cells[1]
+        username = cells[2].lstrip("@") if len(cells) > 2 else ""
+
+        if not user_id.isdigit() or int(user_id) <= 0:
+            errors.append(f"строка {line_number}: некорректный user_id «{user_id}»")
+            continue
+
+        if not first_name or len(first_name) > MAX_NAME_LENGTH:
+            errors.append(f"строка {line_number}: имя пустое или длиннее {MAX_NAME_LENGTH} символов")
+            continue
+
+        if username and not USERNAME_RE.match(username):
+            errors.append(f"строка {line_number}: некорректный username «{username}»")
+            continue
+
+        participant = {
+            "user_id": int(user_id),
+            "first_name": first_name,
+            "username": username or None
+        }
+
+        if participant["user_id"] in seen:
+            duplicates.append(participant)
+            continue
+
+        seen.add(participant["user_id"])
+        participants.append(participant)
+
+    return participants, errors, duplicates
@@ -1,13 +1,15 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from typing import List
+from typing import Dict, List
+from urllib.parse import quote
+import callbacks as cb
 
 
 def main_menu() -> InlineKeyboardMarkup:
     """Главное меню"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🎅 Создать группу", callback_data="create_group")],
-        [InlineKeyboardButton(text="👥 Мои группы", callback_data="my_groups")],
-        [InlineKeyboardButton(text="📝 Присоединиться", callback_data="join_group")],
+        [InlineKeyboardButton(text="🎅 Создать группу", callback_data=cb.CreateGroupCallback().pack())],
+        [InlineKeyboardButton(text="👥 Мои группы", callback_data=cb.MyGroupsCallback().pack())],
+        [InlineKeyboardButton(text="📝 Присоединиться", callback_data=cb.JoinGroupCallback().pack())],
     ])
     return keyboard
 
@@ -21,10 +23,10 @@ def group_list_keyboard(groups: List[dict]) -> InlineKeyboardMarkup:
         button_text = f"{status} {group['name']} ({group['participants_count']} чел.)"
         buttons.append([InlineKeyboardButton(
             text=button_text,
-            callback_data=f"group_info_{group['invite_code']}"
+            callback_data=cb.GroupInfoCallback(code=group["invite_code"]).pack()
         )])
 
-    buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data="back_to_menu")])
+    buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data=cb.MainMenuCallback().pack())])
 
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
@@ -36,37 +38,63 @@ def group_info_keyboard(invite_code: str, is_admin: bool, is_distributed: bool,
     # Общие кнопки для всех участников
     buttons.append([InlineKeyboardButton(
         text="📋 Список участников",
-        callback_data=f"participants_{invite_code}"
+        callback_data=cb.ParticipantsCallback(code=invite_code).pack()
     )])
 
     buttons.append([InlineKeyboardButton(
         text="🎁 Мой список пожеланий",
-        callback_data=f"set_wishlist_{invite_code}"
+        callback_data=cb.WishlistCallback(code=invite_code).pack()
     )])
 
     # Кнопки только для админа
     if is_admin:
         buttons.append([InlineKeyboardButton(
             text="🔗 Пригласительная ссылка",
-            callback_data=f"invite_link_{invite_code}"
+            callback_data=cb.InviteLinkCallback(code=invite_code).pack()
         )])
 
+        buttons.append([
+            InlineKeyboardButton(
+                text="📤 Выгрузка CSV",
+                callback_data=cb.ExportCallback(code=invite_code, fmt="csv").pack()
+            ),
+            InlineKeyboardButton(
+                text="📤 Выгрузка JSON",
+                callback_data=cb.ExportCallback(code=invite_code, fmt="json").pack()
+            )
+        ])
+
+        buttons.append([
+            InlineKeyboardButton(
+                text="📊 Статистика",
+                callback_data=cb.GroupStatsCallback(code=invite_code).pack()
+            ),
+            InlineKeyboardButton(
+                text="⏰ Расписание",
+                callback_data=cb.DeadlinesCallback(code=invite_code).pack()
+            )
+        ])
+
         if not is_distributed:
+            buttons.append([InlineKeyboardButton(
+                text="📥 Импорт участников",
+                callback_data=cb.ImportCallback(code=invite_code).pack()
+            )])
             buttons.append([InlineKeyboardButton(
                 text="🎲 Начать распределение",
-                callback_data=f"start_distribution_{invite_code}"
+                callback_data=cb.StartDistributionCallback(code=invite_code).pack()
             )])
         else:
             buttons.append([InlineKeyboardButton(
                 text="🔄 Отменить распределение",
-                callback_data=f"cancel_distribution_{invite_code}"
+                callback_data=cb.CancelDistributionCallback(code=invite_code).pack()
             )])
 
     # Кнопка для просмотра получателя (после распределения)
     if is_distributed:
         buttons.append([InlineKeyboardButton(
             text="🎁 Кому я дарю подарок?",
-            callback_data=f"my_recipient_{invite_code}"
+            callback_data=cb.MyRecipientCallback(code=invite_code).pack()
         )])
 
         # Кнопки для работы с QR-кодами (только после распределения)
@@ -75,28 +103,40 @@ def group_info_keyboard(invite_code: str, is_admin: bool, is_distributed: bool,
             if has_qr_code:
                 buttons.append([InlineKeyboardButton(
                     text="🔄 Заменить QR-код",
-                    callback_data=f"upload_qr_{invite_code}"
+                    callback_data=cb.UploadQRCallback(code=invite_code).pack()
                 )])
             else:
                 buttons.append([InlineKeyboardButton(
                     text="📤 Загрузить QR-код",
-                    callback_data=f"upload_qr_{invite_code}"
+                    callback_data=cb.UploadQRCallback(code=invite_code).pack()
                 )])
 
             # Кнопка просмотра QR-кода для получателя
             if recipient_has_qr:
                 buttons.append([InlineKeyboardButton(
                     text="📱 Посмотреть QR-код получения",
-                    callback_data=f"view_qr_{invite_code}"
+                    callback_data=cb.ViewQRCallback(code=invite_code).pack()
                 )])
 
-    buttons.append([InlineKeyboardButton(text="◀️ К моим группам", callback_data="my_groups")])
+            # Анонимная переписка с получателем и со своим Сантой
+            buttons.append([
+                InlineKeyboardButton(
+                    text="✉️ Написать получателю",
+                    callback_data=cb.WriteRecipientCallback(code=invite_code).pack()
+                ),
+                InlineKeyboardButton(
+                    text="✉️ Написать Санте",
+                    callback_data=cb.WriteSantaCallback(code=invite_code).pack()
+                )
+            ])
+
+    buttons.append([InlineKeyboardButton(text="◀️ К моим группам", callback_data=cb.MyGroupsCallback().pack())])
 
     # Кнопка удаления группы (только для админа)
     if is_admin:
         buttons.append([InlineKeyboardButton(
             text="🗑️ Удалить группу",
-            callback_data=f"delete_group_{invite_code}"
+            callback_data=cb.DeleteGroupCallback(code=invite_code).pack()
         )])
 
     return InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -105,18 +145,30 @@ def group_info_keyboard(invite_code: str, is_admin: bool, is_distributed: bool,
 def back_button() -> InlineKeyboardMarkup:
     """Кнопка назад"""
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="◀️ Назад", callback_data="back_to_menu")]
+        [InlineKeyboardButton(text="◀️ Назад", callback_data=cb.MainMenuCallback().pack())]
     ])
 
 
-def confirm_distribution(invite_code: str) -> InlineKeyboardMarkup:
+def confirm_distribution(invite_code: str, roster: int) -> InlineKeyboardMarkup:
     """Подтверждение распределения"""
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="✅ Да, начать", callback_data=f"confirm_dist_{invite_code}")],
-        [InlineKeyboardButton(text="❌ Отмена", callback_data=f"group_info_{invite_code}")]
+        [InlineKeyboardButton(text="✅ Да, начать", callback_data=cb.ConfirmDistributionCallback(code=invite_code, roster=roster).pack())],
+        [InlineKeyboardButton(text="❌ Отмена", callback_data=cb.GroupInfoCallback(code=invite_code).pack())]
     ])
 
 
+def notifications_report(invite_code: str, has_failed: bool) -> InlineKeyboardMarkup:
+    """Отчёт о рассылке: повтор неудачных уведомлений и возврат к группе"""
+    buttons = []
+    if has_failed:
+        buttons.append([InlineKeyboardButton(
+            text="🔁 Отправить неудачные ещё раз",
+            callback_data=cb.RetryNotificationsCallback(code=invite_code).pack()
+        )])
+    buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data=cb.GroupInfoCallback(code=invite_code).pack())])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
 def cancel_action(callback_data: str) -> InlineKeyboardMarkup:
     """Кнопка отмены действия"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -127,13 +179,84 @@ def cancel_action(callback_data: str) -> InlineKeyboardMarkup:
 def confirm_delete_group(invite_code: str) -> InlineKeyboardMarkup:
     """Подтверждение удаления группы"""
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="✅ Да, удалить навсегда", callback_data=f"confirm_delete_{invite_code}")],
-        [InlineKeyboardButton(text="❌ Отмена", callback_data=f"group_info_{invite_code}")]
+        [InlineKeyboardButton(text="✅ Да, удалить навсегда", callback_data=cb.ConfirmDeleteCallback(code=invite_code).pack())],
+        [InlineKeyboardButton(text="❌ Отмена", callback_data=cb.GroupInfoCallback(code=invite_code).pack())]
     ])
 
 
 def back_to_group(invite_code: str) -> InlineKeyboardMarkup:
     """Кнопка возврата к информации о группе"""
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="◀️ Назад", callback_data=f"group_info_{invite_code}")]
+        [InlineKeyboardButton(text="◀️ Назад", callback_data=cb.GroupInfoCallback(code=invite_code).pack())]
+    ])
+
+
+def relay_reply(invite_code: str, to_giver: bool) -> InlineKeyboardMarkup:
+    """Ответ на анонимное сообщение и возврат к группе"""
+    if to_giver:
+        reply_data = cb.WriteSantaCallback(code=invite_code).pack()
+    else:
+        reply_data = cb.WriteRecipientCallback(code=invite_code).pack()
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="↩️ Ответить", callback_data=reply_data)],
+        [InlineKeyboardButton(text="◀️ К группе", callback_data=cb.GroupInfoCallback(code=invite_code).pack())]
     ])
+
+
+def participants_page_keyboard(invite_code: str, page: int, total_pages: int) -> InlineKeyboardMarkup:
+    """Навигация по страницам списка участников"""
+    buttons = []
+
+    nav_row = []
+    if page > 0:
+        nav_row.append(InlineKeyboardButton(
+            text="⬅️ Назад",
+            callback_data=cb.ParticipantsCallback(code=invite_code, page=page - 1).pack()
+        ))
+    if page < total_pages - 1:
+        nav_row.append(InlineKeyboardButton(
+            text="Вперёд ➡️",
+            callback_data=cb.ParticipantsCallback(code=invite_code, page=page + 1).pack()
+        ))
+    if nav_row:
+        buttons.append(nav_row)
+
+    buttons.append([InlineKeyboardButton(text="◀️ К группе", callback_data=cb.GroupInfoCallback(code=invite_code).pack())])
+
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def invite_link_keyboard(invite_code: str, invite_link: str) -> InlineKeyboardMarkup:
+    """Кнопки для пересылки пригласительной ссылки"""
+    share_text = quote("Присоединяйся к игре в Тайного Санту! 🎅")
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(
+            text="📨 Поделиться ссылкой",
+            url=f"https://t.me/share/url?url={quote(invite_link)}&text={share_text}"
+        )],
+        [InlineKeyboardButton(text="◀️ Назад", callback_data=cb.GroupInfoCallback(code=invite_code).pack())]
+    ])
+
+
+def deadlines_keyboard(invite_code: str, is_distributed: bool, scheduled: Dict[str, bool]) -> InlineKeyboardMarkup:
+    """Клавиатура расписания группы. `scheduled` — тип задания → запланировано ли"""
+    buttons = []
+
+    kinds = [("distribute", "🎲 распределение"), ("remind_qr", "⏰ напоминание о QR-кодах")]
+    for kind, title in kinds:
+        # Распределение по расписанию имеет смысл только до распределения
+        if kind == "distribute" and is_distributed:
+            continue
+
+        buttons.append([InlineKeyboardButton(
+            text=f"{'✏️ Изменить' if scheduled.get(kind) else '➕ Запланировать'} {title}",
+            callback_data=cb.SetDeadlineCallback(code=invite_code, kind=kind).pack()
+        )])
+        if scheduled.get(kind):
+            buttons.append([InlineKeyboardButton(
+                text=f"🗑 Отменить {title}",
+                callback_data=cb.CancelDeadlineCallback(code=invite_code, kind=kind).pack()
+            )])
+
+    buttons.append([InlineKeyboardButton(text="◀️ К группе", callback_data=cb.GroupInfoCallback(code=invite_code).pack())])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -0,0 +1,91 @@
+"""Нагрузочный тест бота против локальной замены Bot API.
+
+Запуск (без сети, подходит для CI):
+    python -m loadtest --groups 50 --members 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+
+# Настройки окружения нужно задать до импорта config
+os.environ.setdefault("BOT_TOKEN", "123456:LOADTEST")
+os.environ.setdefault("THROTTLE_RATE", "1000")
+os.environ.setdefault("THROTTLE_BURST", "1000")
+# Замена Bot API не ограничивает скорость; лимиты оставлены высокими, чтобы замерять бота, а не ожидание
+os.environ.setdefault("BOT_RATE_LIMIT", "10000")
+os.environ.setdefault("BOT_CHAT_RATE", "1000")
+os.environ.setdefault("BOT_CHAT_BURST", "1000")
+# Альбом собирается быстрее, чтобы не растягивать замер загрузки QR-кодов
+os.environ.setdefault("QR_ALBUM_WINDOW", "0.2")
+
+from aiogram import Bot
+from aiogram.client.telegram import TelegramAPIServer
+import bot as santa_bot
+import database as db
+from config import BOT_TOKEN
+from handlers import qr_codes
+from loadtest.fake_api import FakeTelegramAPI
+from logs import setup_logging
+from loadtest.report import build_report, format_report
+from loadtest.scenario import Driver, Stats, run_scenario
+from scheduler import scheduler
+
+
+async def run(args) -> dict:
+    with tempfile.TemporaryDirectory(prefix="santa_loadtest_") as workdir:
+        # Отдельная база и папка QR-кодов, чтобы не трогать рабочие данные
+        db.DB_FILE = os.path.join(workdir, "data.json")
+        qr_codes.QR_CODES_DIR = os.path.join(workdir, "qr_codes")
+        scheduler.journal_path = os.path.join(workdir, "jobs.log")
+        db.ARCHIVE_DIR = os.path.join(workdir, "archive")
+        santa_bot.UPDATES_FILE = os.path.join(workdir, "updates.log")
+        os.makedirs(qr_codes.QR_CODES_DIR)
+        db.init_db()
+
+        api = FakeTelegramAPI()
+        await api.start()
+
+        session = santa_bot.create_session(api=TelegramAPIServer.from_base(api.base_url))
+        bot = Bot(token=BOT_TOKEN, session=session)
+        dp = santa_bot.create_dispatcher()
+        polling = asyncio.create_task(santa_bot.run(bot, dp, polling_timeout=1, handle_signals=False))
+
+        stats = Stats()
+        driver = Driver(api, stats, timeout=args.timeout)
+        try:
+            await run_scenario(driver, args.groups, args.members, args.concurrency)
+        finally:
+            await dp.stop_polling()
+            await polling
+            await api.stop()
+
+        return build_report(stats, api)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота Тайный Санта")
+    parser.add_argument("--groups", type=int, default=20, help="количество групп")
+    parser.add_argument("--members", type=int, default=10, help="участников в группе кроме админа")
+    parser.add_argument("--concurrency", type=int, default=10, help="групп одновременно")
+    parser.add_argument("--timeout", type=float, default=30.0, help="ожидание ответа на шаг, сек")
+    parser.add_argument("--max-error-rate", type=float, default=0.0,
+                        help="доля ошибок, выше которой тест считается проваленным")
+    parser.add_argument("--json", action="store_true", help="вывести отчёт в JSON")
+    args = parser.parse_args(argv)
+
+    # Логи каждого обновления искажают замер
+    setup_logging()
+    logging.getLogger("aiogram").setLevel(logging.WARNING)
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, ensure_ascii=False, indent=2) if args.json else format_report(report))
+
+    return 1 if report["error_rate"] > args.max_error_rate else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+from aiohttp import web
+
+BOT_USER = {
+    "id": 42,
+    "is_bot": True,
+    "first_name": "Santa Load Test",
+    "username": "santa_loadtest_bot"
+}
+
+# Содержимое «фото», которое бот скачивает через getFile
+FAKE_FILE_CONTENT = b"\xff\xd8\xff\xe0" + b"\0" * 2048
+
+
+class FakeTelegramAPI:
+    """Локальная замена Bot API для нагрузочного тестирования.
+
+    Отдаёт обновления через getUpdates и принимает вызовы методов бота.
+    Каждый вызов передаётся в `on_call`, чтобы сценарий мог дождаться ответа.
+    """
+
+    def __init__(self, on_call: Optional[Callable[[str, Dict[str, Any]], None]] = None):
+        self.on_call = on_call
+        self.calls = Counter()
+        self.errors = Counter()
+        self._updates: List[Dict] = []
+        self._update_id = 0
+        self._message_id = 0
+        self._new_updates = asyncio.Event()
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    def push_update(self, update: Dict) -> int:
+        """Постановка обновления в очередь getUpdates"""
+        self._update_id += 1
+        update["update_id"] = self._update_id
+        self._updates.append(update)
+        self._new_updates.set()
+        return self._update_id
+
+    def next_message_id(self) -> int:
+        self._message_id += 1
+        return self._message_id
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        """Запуск HTTP-сервера. Порт 0 выбирает свободный порт"""
+        app = web.Application(client_max_size=20 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self._handle_method)
+        app.router.add_get("/file/bot{token}/{path:.+}", self._handle_file)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.base_url = f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _handle_file(self, request: web.Request) -> web.Response:
+        return web.Response(body=FAKE_FILE_CONTENT)
+
+    async def _handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = {}
+        if request.can_read_body:
+            for key, value in (await request.post()).items():
+                params[key] = value if isinstance(value, str) else value.filename
+
+        self.calls[method] += 1
+        handler = getattr(self, f"_method_{method}", None)
+        if handler is None:
+            self.errors[method] += 1
+            return web.json_response(
+                {"ok": False, "error_code": 404, "description": "Not Found: method not found"}
+            )
+
+        result = await handler(params)
+        if self.on_call is not None and method != "getUpdates":
+            self.on_call(method, params)
+        return web.json_response({"ok": True, "result": result})
+
+    # Методы Bot API
+    async def _method_getMe(self, params: Dict) -> Dict:
+        return BOT_USER
+
+    async def _method_deleteWebhook(self, params: Dict) -> bool:
+        return True
+
+    async def _method_getUpdates(self, params: Dict) -> List[Dict]:
+        offset = int(params.get("offset", 0))
+        limit = int(params.get("limit", 100))
+        timeout = float(params.get("timeout", 0))
+
+        # Подтверждённые обновления больше не нужны
+        self._updates = [update for update in self._updates if update["update_id"] >= offset]
+
+        if not self._updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        return self._updates[:limit]
+
+    def _message(self, params: Dict, **extra) -> Dict:
+        message = {
+            "message_id": self.next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": int(params["chat_id"]), "type": "private"},
+            "from": BOT_USER
+        }
+        message.update(extra)
+        return message
+
+    async def _method_sendMessage(self, params: Dict) -> Dict:
+        return self._message(params, text=params.get("text", ""))
+
+    async def _method_editMessageText(self, params: Dict) -> Dict:
+        message = self._message(params, text=params.get("text", ""))
+        message["message_id"] = int(params["message_id"])
+        return message
+
+    async def _method_answerCallbackQuery(self, params: Dict) -> bool:
+        return True
+
+    async def _method_sendPhoto(self, params: Dict) -> Dict:
+        photo = [{"file_id": "photo", "file_unique_id": "photo", "width": 512, "height": 512}]
+        return self._message(params, photo=photo, caption=params.get("caption"))
+
+    async def _method_sendDocument(self, params: Dict) -> Dict:
+        document = {"file_id": "document", "file_unique_id": "document"}
+        return self._message(params, document=document, caption=params.get("caption"))
+
+    async def _method_sendMediaGroup(self, params: Dict) -> List[Dict]:
+        media = json.loads(params.get("media", "[]"))
+        photo = [{"file_id": "photo", "file_unique_id": "photo", "width": 512, "height": 512}]
+        return [self._message(params, photo=photo) for _ in media]
+
+    async def _method_getFile(self, params: Dict) -> Dict:
+        file_id = params["file_id"]
+        return {
+            "file_id": file_id,
+            "file_unique_id": file_id,
+            "file_size": len(FAKE_FILE_CONTENT),
+            "file_path": f"photos/{file_id}.jpg"
+        }
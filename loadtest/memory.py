@@ -0,0 +1,107 @@
+"""Сравнение памяти, которую занимает база в виде словарей и в виде записей models.
+
+Запуск:
+    python -m loadtest.memory --groups 2000 --members 100
+"""
+import argparse
+import gc
+import json
+import random
+import sys
+import tracemalloc
+from typing import Callable, Dict
+import database as db
+from migrations import SCHEMA_VERSION
+
+FIRST_NAMES = ["Анна", "Иван", "Мария", "Алексей", "Екатерина", "Дмитрий", "Ольга", "Сергей", "Наталья", "Павел"]
+WISHLISTS = ["", "", "", "Книга или настольная игра", "Что-нибудь к чаю", "Тёплые носки"]
+
+
+def generate_db(groups: int, members: int, seed: int = 0) -> str:
+    """JSON базы в формате data.json со случайными группами"""
+    rnd = random.Random(seed)
+    data = {"schema_version": SCHEMA_VERSION, "groups": {}}
+    user_ids = [1_000_000 + i for i in range(groups * members // 2 + members)]
+
+    for index in range(groups):
+        invite_code = f"g{index:07d}"
+        participant_ids = rnd.sample(user_ids, members)
+        participants = {
+            str(user_id): {
+                "first_name": rnd.choice(FIRST_NAMES),
+                "username": rnd.choice([None, f"user{user_id % 500}"]),
+                "wishlist": rnd.choice(WISHLISTS)
+            }
+            for user_id in participant_ids
+        }
+        # Половина групп уже распределена, у части дарителей есть QR-код
+        assignments = {}
+        if index % 2:
+            for i, giver in enumerate(participant_ids):
+                assignments[str(giver)] = {
+                    "receiver_id": str(participant_ids[(i + 1) % members]),
+                    "qr_codes": [
+                        {"path": f"qr_codes/{invite_code}_{giver}.jpg", "file_id": f"qr{giver}"}
+                    ] if i % 3 == 0 else [],
+                    "delivery": "sent"
+                }
+
+        data["groups"][invite_code] = {
+            "name": f"Группа {index}",
+            "admin_id": participant_ids[0],
+            "invite_code": invite_code,
+            "participants": participants,
+            "assignments": assignments,
+            "is_distributed": bool(index % 2),
+            "version": 1,
+            "roster_version": 1,
+            "updated_at": 0.0,
+            "relay_log": []
+        }
+
+    return json.dumps(data, ensure_ascii=False)
+
+
+def measure(load: Callable[[], object]) -> int:
+    """Память, которая остаётся занятой загруженными данными, в байтах"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        data = load()
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del data
+    return current
+
+
+def run(groups: int, members: int) -> Dict:
+    payload = generate_db(groups, members)
+    dict_bytes = measure(lambda: json.loads(payload))
+    model_bytes = measure(lambda: db.deserialize_db(json.loads(payload)))
+    return {
+        "groups": groups,
+        "participants": groups * members,
+        "dict_mb": round(dict_bytes / 2 ** 20, 1),
+        "model_mb": round(model_bytes / 2 ** 20, 1),
+        "reduction": round(1 - model_bytes / dict_bytes, 3)
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Сравнение памяти словарей и записей models")
+    parser.add_argument("--groups", type=int, default=2000, help="количество групп")
+    parser.add_argument("--members", type=int, default=100, help="участников в группе")
+    args = parser.parse_args(argv)
+
+    result = run(args.groups, args.members)
+    print(f"Групп: {result['groups']}, участников: {result['participants']}")
+    print(f"Словари:        {result['dict_mb']} МБ")
+    print(f"Записи models:  {result['model_mb']} МБ")
+    print(f"Экономия:       {result['reduction']:.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Задержка чтений, пока большая группа распределяется и база пишется на диск.
+
+Запуск:
+    python -m loadtest.read_latency --groups 2000 --members 100 --big 3000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List
+import database as db
+from loadtest.memory import generate_db
+from loadtest.report import percentile
+
+
+async def measure(rounds: int, big: int) -> List[float]:
+    """Время каждого шага цикла чтений, пока идут распределения и их запись"""
+    db.start_write_behind(0.01, 0.1)
+    invite_code = db.create_group(1, "Админ", None, "Большая группа")
+    db.add_participants(invite_code, [
+        {"user_id": user_id, "first_name": f"Участник {user_id}", "username": None}
+        for user_id in range(2, big + 1)
+    ])
+    await db.wait_durable()
+
+    latencies: List[float] = []
+    stopped = False
+
+    async def reader():
+        while not stopped:
+            started = time.perf_counter()
+            await asyncio.sleep(0)
+            db.get_group(invite_code)
+            db.get_recipient(2, invite_code)
+            db.get_user_groups(2)
+            latencies.append(time.perf_counter() - started)
+
+    task = asyncio.create_task(reader())
+    for _ in range(rounds):
+        db.distribute_santa(invite_code)
+        await asyncio.sleep(0.05)
+        db.cancel_distribution(invite_code)
+        await asyncio.sleep(0.05)
+    await db.wait_durable()
+
+    stopped = True
+    await task
+    await db.stop_write_behind()
+    return latencies
+
+
+def run(groups: int, members: int, big: int, rounds: int) -> Dict:
+    with tempfile.TemporaryDirectory(prefix="santa_reads_") as workdir:
+        db.DB_FILE = os.path.join(workdir, "data.json")
+        with open(db.DB_FILE, "w", encoding="utf-8") as f:
+            f.write(generate_db(groups, members))
+        db.load_db()
+
+        values = sorted(asyncio.run(measure(rounds, big)))
+
+    return {
+        "reads": len(values),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2)
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Задержка чтений во время записи базы")
+    parser.add_argument("--groups", type=int, default=2000, help="количество групп в базе")
+    parser.add_argument("--members", type=int, default=100, help="участников в группе")
+    parser.add_argument("--big", type=int, default=3000, help="участников в распределяемой группе")
+    parser.add_argument("--rounds", type=int, default=5, help="сколько раз распределить и отменить")
+    args = parser.parse_args(argv)
+
+    result = run(args.groups, args.members, args.big, args.rounds)
+    print(f"Чтений: {result['reads']}")
+    print(f"Задержка: p50 {result['p50_ms']} мс, p99 {result['p99_ms']} мс, max {result['max_ms']} мс")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
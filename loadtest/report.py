@@ -0,0 +1,82 @@
+from typing import Dict, List
+from loadtest.fake_api import FakeTelegramAPI
+from loadtest.scenario import Stats
+from reads import reads
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Перцентиль по отсортированному списку (ближайший ранг)"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(fraction * len(values)) - 1))
+    return values[index]
+
+
+def summarize(latencies: List[float]) -> Dict:
+    """Перцентили задержки в миллисекундах"""
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+        "p90_ms": round(percentile(values, 0.90) * 1000, 2),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0
+    }
+
+
+def build_report(stats: Stats, api: FakeTelegramAPI) -> Dict:
+    """Итоговый отчёт нагрузочного теста"""
+    duration = stats.finished_at - stats.started_at
+    all_latencies = [latency for values in stats.latencies.values() for latency in values]
+    errors = sum(stats.errors.values()) + sum(api.errors.values())
+
+    return {
+        "duration_s": round(duration, 3),
+        "steps": stats.steps,
+        "throughput_per_s": round(stats.steps / duration, 2) if duration else 0.0,
+        "errors": errors,
+        "error_rate": round(errors / stats.steps, 4) if stats.steps else 0.0,
+        "latency": summarize(all_latencies),
+        "steps_latency": {step: summarize(values) for step, values in sorted(stats.latencies.items())},
+        "error_kinds": dict(stats.errors),
+        "group_reads": reads.stats(),
+        "api_calls": dict(api.calls),
+        "api_errors": dict(api.errors)
+    }
+
+
+def format_report(report: Dict) -> str:
+    """Отчёт в виде текстовой таблицы"""
+    latency = report["latency"]
+    lines = [
+        f"Длительность: {report['duration_s']} с",
+        f"Шагов: {report['steps']}, пропускная способность: {report['throughput_per_s']} обновлений/с",
+        f"Ошибок: {report['errors']} ({report['error_rate']:.2%})",
+        f"Задержка: p50 {latency['p50_ms']} мс, p90 {latency['p90_ms']} мс, "
+        f"p99 {latency['p99_ms']} мс, max {latency['max_ms']} мс",
+        "",
+        f"{'Шаг':<24}{'кол-во':>8}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}"
+    ]
+
+    for step, summary in report["steps_latency"].items():
+        lines.append(
+            f"{step:<24}{summary['count']:>8}{summary['p50_ms']:>10}"
+            f"{summary['p90_ms']:>10}{summary['p99_ms']:>10}{summary['max_ms']:>10}"
+        )
+
+    if report["error_kinds"]:
+        lines.append("")
+        lines.append("Ошибки по шагам:")
+        lines.extend(f"  {kind}: {count}" for kind, count in sorted(report["error_kinds"].items()))
+
+    group_reads = report["group_reads"]
+    lines.append("")
+    lines.append(
+        f"Чтения групп: из памяти={group_reads['hits']}, загрузок из архива={group_reads['loads']}, "
+        f"объединено с чужой загрузкой={group_reads['coalesced']}, не найдено={group_reads['misses']}"
+    )
+    lines.append("Вызовы Bot API: " + ", ".join(
+        f"{method}={count}" for method, count in sorted(report["api_calls"].items())
+    ))
+
+    return "\n".join(lines)
@@ -0,0 +1,272 @@
+import asyncio
+import itertools
+import json
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional
+from callbacks import (
+    ConfirmDistributionCallback, CreateGroupCallback, GroupInfoCallback, GroupStatsCallback, JoinGroupCallback,
+    MyRecipientCallback, ParticipantsCallback, StartDistributionCallback, UploadQRCallback,
+    ViewQRCallback, WishlistCallback, WriteSantaCallback
+)
+from loadtest.fake_api import BOT_USER, FakeTelegramAPI
+
+# Первый Telegram ID симулируемых пользователей
+FIRST_USER_ID = 1_000_000
+
+INVITE_CODE_RE = re.compile(r"<code>(\w+)</code>")
+
+Predicate = Callable[[str, Dict], bool]
+
+
+class StepError(Exception):
+    """Шаг сценария завершился ошибкой"""
+
+    def __init__(self, kind: str):
+        super().__init__(kind)
+        self.kind = kind
+
+
+class Stats:
+    """Сбор задержек и ошибок по шагам сценария"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors = Counter()
+        self.steps = 0
+        self.started_at = time.perf_counter()
+        self.finished_at = self.started_at
+
+    def record(self, step: str, latency: float):
+        self.steps += 1
+        self.latencies[step].append(latency)
+
+    def fail(self, step: str, kind: str):
+        self.steps += 1
+        self.errors[f"{step}: {kind}"] += 1
+
+    def finish(self):
+        self.finished_at = time.perf_counter()
+
+
+class Driver:
+    """Отправка обновлений в фейковый API и ожидание ответов бота"""
+
+    def __init__(self, api: FakeTelegramAPI, stats: Stats, timeout: float):
+        self.api = api
+        self.stats = stats
+        self.timeout = timeout
+        self._chat_waiters: Dict[int, List[tuple]] = defaultdict(list)
+        self._callback_waiters: Dict[str, asyncio.Future] = {}
+        self._callback_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        # Последняя клавиатура, которую бот показал пользователю
+        self.last_markup: Dict[int, Dict] = {}
+        api.on_call = self._on_call
+
+    def _on_call(self, method: str, params: Dict):
+        if method == "answerCallbackQuery":
+            future = self._callback_waiters.pop(params.get("callback_query_id"), None)
+            if future is not None and not future.done():
+                future.set_result(params)
+            return
+
+        chat_id = params.get("chat_id")
+        if chat_id is None:
+            return
+
+        if params.get("reply_markup"):
+            self.last_markup[int(chat_id)] = json.loads(params["reply_markup"])
+
+        waiters = self._chat_waiters.get(int(chat_id), [])
+        for waiter in list(waiters):
+            predicate, future = waiter
+            if not future.done() and predicate(method, params):
+                future.set_result(params)
+                waiters.remove(waiter)
+                break
+
+    async def _wait(self, future: asyncio.Future) -> Dict:
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            raise StepError("timeout")
+
+    async def send_message(self, user: Dict, predicate: Predicate, **content) -> Dict:
+        """Сообщение от пользователя и ожидание подходящего ответа в его чат"""
+        future = asyncio.get_running_loop().create_future()
+        self._chat_waiters[user["id"]].append((predicate, future))
+        self.push_message(user, **content)
+        try:
+            return await self._wait(future)
+        finally:
+            waiter = (predicate, future)
+            if waiter in self._chat_waiters[user["id"]]:
+                self._chat_waiters[user["id"]].remove(waiter)
+
+    def push_message(self, user: Dict, **content):
+        """Сообщение от пользователя без ожидания ответа"""
+        self.api.push_update({"message": {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user["id"], "type": "private"},
+            "from": user,
+            **content
+        }})
+
+    async def press(self, user: Dict, data: str) -> Dict:
+        """Нажатие inline-кнопки и ожидание answerCallbackQuery"""
+        callback_id = f"{user['id']}:{next(self._callback_ids)}"
+        future = asyncio.get_running_loop().create_future()
+        self._callback_waiters[callback_id] = future
+        self.api.push_update({"callback_query": {
+            "id": callback_id,
+            "from": user,
+            "chat_instance": str(user["id"]),
+            "data": data,
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": user["id"], "type": "private"},
+                "from": BOT_USER,
+                "text": "menu"
+            }
+        }})
+        try:
+            return await self._wait(future)
+        finally:
+            self._callback_waiters.pop(callback_id, None)
+
+
+def reply_contains(text: str) -> Predicate:
+    """Ответ sendMessage, содержащий текст"""
+    return lambda method, params: method == "sendMessage" and text in params.get("text", "")
+
+
+class SimulatedUser:
+    """Пользователь, который проходит шаги сценария по очереди"""
+
+    def __init__(self, driver: Driver, user_id: int):
+        self.driver = driver
+        self.user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+    async def _step(self, step: str, action) -> Optional[Dict]:
+        started = time.perf_counter()
+        try:
+            result = await action
+        except StepError as e:
+            self.driver.stats.fail(step, e.kind)
+            return None
+        self.driver.stats.record(step, time.perf_counter() - started)
+        return result
+
+    def find_button(self, prefix: str) -> Optional[str]:
+        """callback_data кнопки с префиксом из последней показанной клавиатуры"""
+        markup = self.driver.last_markup.get(self.user["id"], {})
+        for row in markup.get("inline_keyboard", []):
+            for button in row:
+                if button.get("callback_data", "").startswith(prefix):
+                    return button["callback_data"]
+        return None
+
+    async def text(self, step: str, text: str, expect: str = "") -> Optional[Dict]:
+        content = {"text": text}
+        if text.startswith("/"):
+            content["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return await self._step(step, self.driver.send_message(self.user, reply_contains(expect), **content))
+
+    async def photo(self, step: str, expect: str = "") -> Optional[Dict]:
+        file_id = f"qr{self.user['id']}"
+        photo = [{"file_id": file_id, "file_unique_id": file_id, "width": 512, "height": 512}]
+        return await self._step(step, self.driver.send_message(self.user, reply_contains(expect), photo=photo))
+
+    async def album(self, step: str, count: int, expect: str = "") -> Optional[Dict]:
+        """Альбом из `count` фото: отдельные сообщения с общим media_group_id, ответ — один"""
+        media_group_id = f"album{self.user['id']}"
+        photos = [
+            [{"file_id": f"qr{self.user['id']}_{i}", "file_unique_id": f"qr{self.user['id']}_{i}", "width": 512, "height": 512}]
+            for i in range(count)
+        ]
+        for photo in photos[1:]:
+            self.driver.push_message(self.user, photo=photo, media_group_id=media_group_id)
+        return await self._step(step, self.driver.send_message(
+            self.user, reply_contains(expect), photo=photos[0], media_group_id=media_group_id
+        ))
+
+    async def press(self, step: str, data: str) -> Optional[Dict]:
+        answer = await self._step(step, self.driver.press(self.user, data))
+        # Ответ с ❌ — пользователь увидел ошибку
+        if answer is not None and "❌" in answer.get("text", ""):
+            self.driver.stats.errors[f"{step}: alert"] += 1
+        return answer
+
+
+async def run_group(driver: Driver, group_index: int, members: int):
+    """Полный сценарий одной группы: создание, вступление, распределение, QR-коды"""
+    base_id = FIRST_USER_ID + group_index * (members + 1)
+    admin = SimulatedUser(driver, base_id)
+    participants = [admin] + [SimulatedUser(driver, base_id + i + 1) for i in range(members)]
+
+    await admin.text("start", "/start", expect="Добро пожаловать")
+    await admin.press("create_group", CreateGroupCallback().pack())
+    reply = await admin.text("create_group_name", f"Load group {group_index}", expect="Пригласительный код")
+    if reply is None:
+        return
+
+    invite_code = INVITE_CODE_RE.search(reply["text"]).group(1)
+
+    async def join(user: SimulatedUser, index: int):
+        # Половина участников вступает по ссылке, половина — вводом кода
+        if index % 2:
+            await user.text("join_deep_link", f"/start {invite_code}", expect="присоединились")
+        else:
+            await user.text("start", "/start", expect="Добро пожаловать")
+            await user.press("join_group", JoinGroupCallback().pack())
+            await user.text("join_group_code", invite_code, expect="присоединились")
+        await user.press("set_wishlist", WishlistCallback(code=invite_code).pack())
+        await user.text("set_wishlist_text", f"Пожелания {user.user['id']}", expect="сохранён")
+
+    await asyncio.gather(*(join(user, i) for i, user in enumerate(participants[1:])))
+
+    await admin.press("group_info", GroupInfoCallback(code=invite_code).pack())
+    await admin.press("participants", ParticipantsCallback(code=invite_code).pack())
+    await admin.press("start_distribution", StartDistributionCallback(code=invite_code).pack())
+    confirm_data = admin.find_button(f"{ConfirmDistributionCallback.__prefix__}:")
+    if confirm_data is None:
+        driver.stats.fail("confirm_distribution", "no_button")
+        return
+    await admin.press("confirm_distribution", confirm_data)
+
+    async def upload(user: SimulatedUser, index: int):
+        await user.press("my_recipient", MyRecipientCallback(code=invite_code).pack())
+        await user.press("upload_qr", UploadQRCallback(code=invite_code).pack())
+        # Каждый третий отправляет подарок несколькими посылками
+        if index % 3 == 2:
+            await user.album("upload_qr_album", 3, expect="успешно загружен")
+        else:
+            await user.photo("upload_qr_photo", expect="успешно загружен")
+
+    await asyncio.gather(*(upload(user, i) for i, user in enumerate(participants)))
+    await asyncio.gather(*(
+        user.press("view_qr", ViewQRCallback(code=invite_code).pack()) for user in participants
+    ))
+
+    async def ask_santa(user: SimulatedUser):
+        await user.press("write_santa", WriteSantaCallback(code=invite_code).pack())
+        await user.text("write_santa_text", "Какой у тебя размер?", expect="Сообщение отправлено")
+
+    await asyncio.gather(*(ask_santa(user) for user in participants))
+    await admin.press("group_stats", GroupStatsCallback(code=invite_code).pack())
+
+
+async def run_scenario(driver: Driver, groups: int, members: int, concurrency: int):
+    """Прогон сценария для нескольких групп, не более `concurrency` одновременно"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(group_index: int):
+        async with semaphore:
+            await run_group(driver, group_index, members)
+
+    await asyncio.gather(*(limited(i) for i in range(groups)))
+    driver.stats.finish()
@@ -0,0 +1,184 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+# Контекст текущего обновления: update_id, user_id, invite_code, handler.
+# Каждое обновление обрабатывается в своей задаче, поэтому контексты не смешиваются.
+_context: ContextVar[Dict[str, object]] = ContextVar("log_context", default={})
+
+CONTEXT_FIELDS = ("update_id", "user_id", "invite_code", "handler")
+
+
+def bind(**fields):
+    """Добавление полей в контекст логов текущей задачи"""
+    context = dict(_context.get())
+    context.update({key: value for key, value in fields.items() if value is not None})
+    _context.set(context)
+
+
+def get_context() -> Dict[str, object]:
+    """Текущий контекст логов"""
+    return _context.get()
+
+
+def set_context(context: Dict[str, object]):
+    """Замена контекста логов (для фоновых задач, которые обрабатывают чужие запросы)"""
+    _context.set(context)
+
+
+class ContextFilter(logging.Filter):
+    """Копирование контекста задачи в запись лога.
+
+    Срабатывает в потоке, который пишет в лог, до передачи записи в очередь.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _context.get()
+        for field in CONTEXT_FIELDS:
+            setattr(record, field, context.get(field))
+        return True
+
+
+class ErrorSampler(logging.Filter):
+    """Ограничение повторяющихся предупреждений и ошибок.
+
+    Записи с одинаковым шаблоном сообщения (например, «не удалось отправить
+    сообщение пользователю %s» при рассылке) проходят не больше `burst` раз
+    за `window` секунд. Число пропущенных записей дописывается к первой
+    записи следующего окна.
+    """
+
+    def __init__(self, burst: int, window: float, max_keys: int = 1000):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.max_keys = max_keys
+        # Ключ → [начало окна, записей в окне, пропущено]
+        self._windows: "OrderedDict[Tuple, list]" = OrderedDict()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            return True
+
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        state = self._windows.get(key)
+
+        if state is None or now - state[0] >= self.window:
+            suppressed = state[2] if state else 0
+            self._windows[key] = [now, 1, 0]
+            self._windows.move_to_end(key)
+            if len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+            if suppressed:
+                record.msg = f"{record.msg} (ещё {suppressed} таких же сообщений пропущено)"
+            return True
+
+        state[1] += 1
+        if state[1] <= self.burst:
+            return True
+
+        state[2] += 1
+        return False
+
+
+class TextFormatter(logging.Formatter):
+    """Текстовый формат с контекстом обновления в конце строки"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        context = " ".join(
+            f"{field}={getattr(record, field)}"
+            for field in CONTEXT_FIELDS
+            if getattr(record, field, None) is not None
+        )
+        if not context:
+            return line
+        # Контекст — в конце первой строки, перед трассировкой исключения
+        head, newline, rest = line.partition("\n")
+        return f"{head} [{context}]{newline}{rest}"
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-запись на строку для сборщиков логов"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _PreformattedQueueHandler(QueueHandler):
+    """QueueHandler, который не склеивает исключение с текстом сообщения.
+
+    Стандартный `prepare` форматирует запись в потоке цикла событий; здесь
+    только подставляются аргументы, а форматирование и запись выполняет
+    фоновый поток.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Трассировку нужно получить сейчас: объект исключения может измениться
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging(level: str = "INFO", fmt: str = "text", error_burst: int = 5, error_window: float = 60.0):
+    """Логирование через очередь: обработчики только кладут записи, вывод пишет фоновый поток"""
+    global _listener
+    if _listener is not None:
+        return
+
+    if fmt == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = TextFormatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(formatter)
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = _PreformattedQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    queue_handler.addFilter(ErrorSampler(error_burst, error_window))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Запись оставшихся логов и остановка фонового потока"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
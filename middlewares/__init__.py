@@ -0,0 +1,13 @@
+from .throttling import ThrottlingMiddleware
+from .logging_context import UpdateContextMiddleware, HandlerContextMiddleware
+from .tracing import TracingMiddleware, TracingRequestMiddleware
+from .deduplication import DeduplicationMiddleware
+
+__all__ = [
+    'ThrottlingMiddleware',
+    'UpdateContextMiddleware',
+    'HandlerContextMiddleware',
+    'TracingMiddleware',
+    'TracingRequestMiddleware',
+    'DeduplicationMiddleware'
+]
@@ -0,0 +1,85 @@
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+import database as db
+
+logger = logging.getLogger(__name__)
+
+
+class DeduplicationMiddleware(BaseMiddleware):
+    """Пропуск повторно доставленных обновлений по update_id (внешний, на update).
+
+    Помнит последние `window` обновлений. Если задан `journal_path`, ID
+    дописываются в журнал, чтобы после перезапуска не обработать заново
+    обновления, которые Telegram отдаст повторно (смещение getUpdates
+    подтверждается только следующим запросом).
+    """
+
+    def __init__(self, window: int = 10000, journal_path: Optional[str] = None):
+        self.window = window
+        self.journal_path = journal_path
+        self.duplicate_count = 0
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+        self._journal = None
+        self._journal_records = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+
+        if self.journal_path and self._journal is None:
+            self._load()
+
+        if not self.remember(event.update_id):
+            self.duplicate_count += 1
+            logger.info("Повторное обновление %s пропущено", event.update_id)
+            return None
+
+        return await handler(event, data)
+
+    def remember(self, update_id: int) -> bool:
+        """Запоминание обновления. False, если оно уже было"""
+        if update_id in self._seen:
+            return False
+
+        self._seen[update_id] = None
+        if len(self._seen) > self.window:
+            self._seen.popitem(last=False)
+
+        if self._journal is not None:
+            # Отметка ставится до обработки: после сбоя обновление не повторится
+            self._journal.write(f"{update_id}\n")
+            self._journal.flush()
+            self._journal_records += 1
+            if self._journal_records > 2 * self.window:
+                self._compact()
+        return True
+
+    def _load(self):
+        """Чтение журнала и его сжатие до последних `window` записей"""
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self._seen[int(line)] = None
+                    except ValueError:
+                        # Оборванная последняя строка после сбоя
+                        continue
+            while len(self._seen) > self.window:
+                self._seen.popitem(last=False)
+        self._compact()
+
+    def _compact(self):
+        if self._journal is not None:
+            self._journal.close()
+        db.write_atomic(self.journal_path, "".join(f"{update_id}\n" for update_id in self._seen))
+        self._journal_records = len(self._seen)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
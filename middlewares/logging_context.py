@@ -0,0 +1,44 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from logs import bind
+
+
+class UpdateContextMiddleware(BaseMiddleware):
+    """Запись update_id и ID пользователя в контекст логов (внешний, на update)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        bind(
+            update_id=event.update_id if isinstance(event, Update) else None,
+            user_id=user.id if user else None
+        )
+        return await handler(event, data)
+
+
+class HandlerContextMiddleware(BaseMiddleware):
+    """Запись имени обработчика и кода группы из состояния FSM (внутренний)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        invite_code = None
+
+        state = data.get("raw_state") and data.get("state")
+        if state is not None:
+            invite_code = (await state.get_data()).get("group_code")
+
+        bind(
+            handler=handler_object.callback.__name__ if handler_object else None,
+            invite_code=invite_code
+        )
+        return await handler(event, data)
@@ -0,0 +1,76 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+
+
+class TokenBucket:
+    """Корзина токенов одного пользователя"""
+
+    __slots__ = ("tokens", "updated_at")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated_at = now
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Ограничение частоты нажатий на кнопки для каждого пользователя.
+
+    У каждого пользователя есть корзина на `burst` токенов, которая пополняется
+    со скоростью `rate` токенов в секунду. Нажатие без свободного токена
+    отбрасывается с коротким ответом, до обработчиков и базы дело не доходит.
+    """
+
+    def __init__(self, rate: float, burst: int, idle_ttl: float = 600.0, max_users: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.idle_ttl = idle_ttl
+        self.max_users = max_users
+        self.throttled_count = 0
+        # Порядок ключей совпадает с порядком последней активности
+        self._buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None or self.allow(user.id):
+            return await handler(event, data)
+
+        self.throttled_count += 1
+        if isinstance(event, CallbackQuery):
+            await event.answer("⏳ Слишком часто, подождите секунду")
+        return None
+
+    def allow(self, user_id: int) -> bool:
+        """Списание токена. False, если пользователь превысил лимит"""
+        now = time.monotonic()
+        self._evict(now)
+
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(self.burst, now)
+            self._buckets[user_id] = bucket
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated_at) * self.rate)
+            bucket.updated_at = now
+            self._buckets.move_to_end(user_id)
+
+        if bucket.tokens < 1:
+            return False
+
+        bucket.tokens -= 1
+        return True
+
+    def _evict(self, now: float):
+        """Удаление неактивных корзин и самых старых при переполнении"""
+        while self._buckets:
+            user_id, bucket = next(iter(self._buckets.items()))
+            if now - bucket.updated_at < self.idle_ttl and len(self._buckets) < self.max_users:
+                break
+            del self._buckets[user_id]
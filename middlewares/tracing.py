@@ -0,0 +1,51 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, Update
+import tracing
+from logs import get_context
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Корневой отрезок трассы на каждое обновление из выборки (внешний, на update)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if not tracing.should_sample():
+            return await handler(event, data)
+
+        with tracing.trace("update") as root:
+            if isinstance(event, Update):
+                root.tag("update_id", event.update_id)
+                root.tag("update_type", event.event_type)
+            try:
+                return await handler(event, data)
+            finally:
+                # Обработчик и группа становятся известны только после маршрутизации
+                context = get_context()
+                if context.get("handler"):
+                    root.name = f"update:{context['handler']}"
+                for field in ("user_id", "invite_code", "handler"):
+                    root.tag(field, context.get(field))
+
+
+class TracingRequestMiddleware(BaseRequestMiddleware):
+    """Дочерний отрезок на каждый запрос к Bot API"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType]
+    ) -> Any:
+        if tracing.current_span() is None:
+            return await make_request(bot, method)
+
+        with tracing.span(f"bot.{method.__api_method__}", chat_id=getattr(method, "chat_id", None)):
+            return await make_request(bot, method)
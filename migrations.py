@@ -0,0 +1,164 @@
+"""Версии схемы хранимых данных и шаги перехода между ними.
+
+Версия записывается в каждый документ: в корень data.json и в group.json
+архивных групп. Файл без версии считается версией 0. Шаг `MIGRATIONS[i]`
+переводит одну группу (словарь в формате файла) из версии i в i + 1;
+рабочая база обновляется один раз при запуске, архивные группы — при
+распаковке.
+
+Перед обновлением рядом с базой остаётся резервная копия. Вернуть её
+(при остановленном боте):
+    python -m migrations rollback
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from models import DELIVERY_SENT
+
+
+class SchemaError(Exception):
+    """Данные нельзя привести к текущей схеме"""
+
+
+def _assignments_as_records(group: Dict):
+    # В первом формате назначение было строкой с ID получателя
+    assignments = group.setdefault("assignments", {})
+    for giver_id, assignment in assignments.items():
+        if isinstance(assignment, str):
+            assignments[giver_id] = {"receiver_id": assignment, "qr_code_path": None}
+
+
+def _group_metadata(group: Dict):
+    # Поля, появившиеся позже: версия для сравнения с обменом, время изменения для архивации.
+    # Настоящее время изменения неизвестно; считаем его моментом обновления, иначе первый
+    # же обход архива унесёт все старые группы как неактивные с 1970 года
+    group.setdefault("is_distributed", False)
+    group.setdefault("version", 0)
+    group.setdefault("updated_at", time.time())
+    for participant in group["participants"].values():
+        participant.setdefault("username", None)
+        participant["wishlist"] = participant.get("wishlist") or ""
+
+
+def _delivery_status(group: Dict):
+    # Распределения, сделанные до отметок о доставке, рассылались сразу целиком
+    for assignment in group["assignments"].values():
+        assignment.setdefault("delivery", DELIVERY_SENT)
+
+
+def _qr_code_lists(group: Dict):
+    # Вместо одного пути к QR-коду — список фото (посылок может быть несколько)
+    for assignment in group["assignments"].values():
+        path = assignment.pop("qr_code_path", None)
+        assignment["qr_codes"] = [{"path": path, "file_id": None}] if path else []
+
+
+def _relay_log(group: Dict):
+    # Журнал анонимной переписки дарителей и получателей
+    group.setdefault("relay_log", [])
+
+
+def _roster_version(group: Dict):
+    # Версия списка участников для подтверждения распределения; прежние кнопки несли версию группы
+    group.setdefault("roster_version", group["version"])
+
+
+MIGRATIONS: List[Callable[[Dict], None]] = [
+    _assignments_as_records,
+    _group_metadata,
+    _delivery_status,
+    _qr_code_lists,
+    _relay_log,
+    _roster_version,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def check_version(version: int):
+    """Ошибка, если данные записаны более новой версией бота"""
+    if version > SCHEMA_VERSION:
+        raise SchemaError(f"схема данных {version} новее поддерживаемой ({SCHEMA_VERSION})")
+
+
+def upgrade_group(group: Dict, version: int) -> Dict:
+    """Перевод группы из версии `version` в текущую (на месте)"""
+    check_version(version)
+    for step in MIGRATIONS[version:]:
+        step(group)
+    return group
+
+
+def upgrade_db(raw: Dict) -> int:
+    """Перевод содержимого data.json в текущую схему (на месте). Возвращает прежнюю версию"""
+    version = raw.get("schema_version", 0)
+    check_version(version)
+    for invite_code, group in raw["groups"].items():
+        try:
+            upgrade_group(group, version)
+        except Exception as e:
+            raise SchemaError(f"группа {invite_code}: {e!r}") from e
+    raw["schema_version"] = SCHEMA_VERSION
+    return version
+
+
+def backup_path(path: str, version: int) -> str:
+    """Путь резервной копии файла перед переходом с версии `version`"""
+    return f"{path}.v{version}.bak"
+
+
+def find_backups(path: str) -> List[str]:
+    """Резервные копии файла, от старой версии к новой"""
+    directory = os.path.dirname(os.path.abspath(path))
+    pattern = re.compile(re.escape(os.path.basename(path)) + r"\.v(\d+)\.bak$")
+    found = []
+    for name in os.listdir(directory):
+        match = pattern.match(name)
+        if match:
+            found.append((int(match.group(1)), os.path.join(directory, name)))
+    return [backup for _, backup in sorted(found)]
+
+
+def rollback(path: str) -> Optional[str]:
+    """Возврат последней резервной копии на место файла. Возвращает путь копии или None"""
+    backups = find_backups(path)
+    if not backups:
+        return None
+
+    latest = backups[-1]
+    tmp_path = f"{path}.rollback"
+    shutil.copyfile(latest, tmp_path)
+    os.replace(tmp_path, path)
+    return latest
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Версия схемы data.json и откат обновления")
+    parser.add_argument("command", choices=["status", "rollback"])
+    parser.add_argument("--db", default=os.getenv("DB_FILE", "data.json"), help="путь к файлу базы")
+    args = parser.parse_args(argv)
+
+    if args.command == "rollback":
+        restored = rollback(args.db)
+        if restored is None:
+            print(f"Резервных копий {args.db} нет")
+            return 1
+        print(f"{args.db} восстановлен из {restored}")
+        return 0
+
+    with open(args.db, "r", encoding="utf-8") as f:
+        version = json.load(f).get("schema_version", 0)
+    print(f"Схема {args.db}: {version}, текущая: {SCHEMA_VERSION}")
+    for backup in find_backups(args.db):
+        print(f"Резервная копия: {backup}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
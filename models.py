@@ -0,0 +1,235 @@
+import sys
+from dataclasses import dataclass, field, replace
+from typing import Collection, Dict, List, Optional, Tuple
+
+# Записи групп в памяти. В data.json хранятся вложенные словари со строковыми
+# ID пользователей; преобразование выполняется только при чтении и записи файла.
+# Словари уже приведены к текущей схеме (см. migrations.py).
+# Участники и назначения неизменяемы: изменение — это замена записи в словаре
+# группы (set_participant, set_assignment), поэтому копия группы может делить
+# их со старой версией.
+
+# Доставка дарителю уведомления с именем получателя
+DELIVERY_PENDING = "pending"
+DELIVERY_SENT = "sent"
+DELIVERY_FAILED = "failed"
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    """Одна копия повторяющейся строки (имена и ники встречаются во многих группах)"""
+    return sys.intern(value) if value else value
+
+
+@dataclass(slots=True, frozen=True)
+class Participant:
+    first_name: str
+    username: Optional[str] = None
+    wishlist: str = ""
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Participant":
+        return cls(
+            first_name=_intern(data["first_name"]),
+            username=_intern(data.get("username")),
+            wishlist=data.get("wishlist") or ""
+        )
+
+    def to_dict(self) -> Dict:
+        return {"first_name": self.first_name, "username": self.username, "wishlist": self.wishlist}
+
+
+@dataclass(slots=True, frozen=True)
+class QRCode:
+    path: str
+    # ID фото на серверах Telegram: по нему фото отправляется повторно без загрузки файла
+    file_id: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "QRCode":
+        return cls(path=data["path"], file_id=data["file_id"])
+
+    def to_dict(self) -> Dict:
+        return {"path": self.path, "file_id": self.file_id}
+
+
+@dataclass(slots=True, frozen=True)
+class Assignment:
+    receiver_id: int
+    # По QR-коду на каждую посылку подарка
+    qr_codes: Tuple[QRCode, ...] = ()
+    delivery: str = DELIVERY_PENDING
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Assignment":
+        return cls(
+            receiver_id=int(data["receiver_id"]),
+            qr_codes=tuple(QRCode.from_dict(qr_code) for qr_code in data["qr_codes"]),
+            delivery=data["delivery"]
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            "receiver_id": str(self.receiver_id),
+            "qr_codes": [qr_code.to_dict() for qr_code in self.qr_codes],
+            "delivery": self.delivery
+        }
+
+
+@dataclass(slots=True, frozen=True)
+class RelayMessage:
+    """Сообщение анонимной переписки дарителя и получателя"""
+    # Переписка определяется дарителем: у каждого дарителя один получатель
+    giver_id: int
+    to_giver: bool
+    text: str
+    sent_at: float
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "RelayMessage":
+        return cls(
+            giver_id=int(data["giver_id"]),
+            to_giver=data["to_giver"],
+            text=data["text"],
+            sent_at=data["sent_at"]
+        )
+
+    def to_dict(self) -> Dict:
+        return {"giver_id": str(self.giver_id), "to_giver": self.to_giver, "text": self.text, "sent_at": self.sent_at}
+
+
+@dataclass(slots=True)
+class Group:
+    name: str
+    admin_id: int
+    invite_code: str
+    participants: Dict[int, Participant] = field(default_factory=dict)
+    # ID дарителя → назначение
+    assignments: Dict[int, Assignment] = field(default_factory=dict)
+    is_distributed: bool = False
+    version: int = 0
+    # Версия списка участников (состав, имена и ники): в отличие от `version`,
+    # не меняется от правки пожеланий, переписки и QR-кодов
+    roster_version: int = 0
+    updated_at: float = 0.0
+    # Последние сообщения анонимной переписки, старые вытесняются новыми
+    relay_log: Tuple[RelayMessage, ...] = ()
+    # ID получателя → ID дарителя; строится при первом обращении, дальше копируется и обновляется вместе с назначениями
+    _givers: Optional[Dict[int, int]] = field(default=None, init=False, repr=False, compare=False)
+    # Отстающие для статистики: участники без пожеланий и дарители без QR-кода (словари как
+    # упорядоченные множества). Не хранятся в файле; меняются вместе с записями через set_participant,
+    # set_assignment и set_assignments, поэтому участников нужно добавлять только через них
+    _without_wishlist: Dict[int, None] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _without_qr: Dict[int, None] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Group":
+        participants = {
+            int(user_id): Participant.from_dict(info) for user_id, info in data["participants"].items()
+        }
+        assignments = {
+            int(giver_id): Assignment.from_dict(assignment) for giver_id, assignment in data["assignments"].items()
+        }
+        group = cls(
+            name=data["name"],
+            admin_id=int(data["admin_id"]),
+            invite_code=data["invite_code"],
+            participants=participants,
+            is_distributed=data["is_distributed"],
+            version=data["version"],
+            roster_version=data["roster_version"],
+            updated_at=data["updated_at"],
+            relay_log=tuple(RelayMessage.from_dict(message) for message in data["relay_log"])
+        )
+        group._without_wishlist = {
+            user_id: None for user_id, participant in participants.items() if not participant.wishlist
+        }
+        group.set_assignments(assignments)
+        return group
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "admin_id": self.admin_id,
+            "invite_code": self.invite_code,
+            "participants": {str(user_id): info.to_dict() for user_id, info in self.participants.items()},
+            "assignments": {
+                str(giver_id): assignment.to_dict() for giver_id, assignment in self.assignments.items()
+            },
+            "is_distributed": self.is_distributed,
+            "version": self.version,
+            "roster_version": self.roster_version,
+            "updated_at": self.updated_at,
+            "relay_log": [message.to_dict() for message in self.relay_log]
+        }
+
+    def clone(self) -> "Group":
+        """Копия для изменения: словари копируются, неизменяемые записи в них общие"""
+        copy = replace(self, participants=dict(self.participants), assignments=dict(self.assignments))
+        # replace() не переносит поля вне конструктора
+        if self._givers is not None:
+            copy._givers = dict(self._givers)
+        copy._without_wishlist = dict(self._without_wishlist)
+        copy._without_qr = dict(self._without_qr)
+        return copy
+
+    @property
+    def wishlist_count(self) -> int:
+        """Сколько участников заполнили пожелания"""
+        return len(self.participants) - len(self._without_wishlist)
+
+    @property
+    def qr_count(self) -> int:
+        """Сколько дарителей загрузили QR-код"""
+        return len(self.assignments) - len(self._without_qr)
+
+    def set_participant(self, user_id: int, participant: Participant):
+        """Добавление или замена участника с учётом версии списка и отстающих без пожеланий"""
+        old = self.participants.get(user_id)
+        if old is None or old.first_name != participant.first_name or old.username != participant.username:
+            self.roster_version += 1
+        if participant.wishlist:
+            self._without_wishlist.pop(user_id, None)
+        else:
+            self._without_wishlist[user_id] = None
+        self.participants[user_id] = participant
+
+    def set_assignment(self, giver_id: int, assignment: Assignment):
+        """Замена назначения дарителя с учётом отстающих без QR-кода"""
+        old = self.assignments.get(giver_id)
+        if assignment.qr_codes:
+            self._without_qr.pop(giver_id, None)
+        else:
+            self._without_qr[giver_id] = None
+        self.assignments[giver_id] = assignment
+        if self._givers is not None:
+            if old is not None and old.receiver_id != assignment.receiver_id:
+                self._givers.pop(old.receiver_id, None)
+            self._givers[assignment.receiver_id] = giver_id
+
+    def set_assignments(self, assignments: Dict[int, Assignment]):
+        """Новое распределение целиком (пустое — отмена)"""
+        self.assignments = assignments
+        self._without_qr = {giver_id: None for giver_id, assignment in assignments.items() if not assignment.qr_codes}
+        self._givers = {assignment.receiver_id: giver_id for giver_id, assignment in assignments.items()}
+
+    def laggards(self) -> Tuple[Collection[int], Collection[int]]:
+        """ID участников без пожеланий и дарителей без QR-кода (в порядке появления)"""
+        return self._without_wishlist.keys(), self._without_qr.keys()
+
+    def giver_of(self, receiver_id: int) -> Optional[int]:
+        """ID дарителя, который дарит подарок получателю.
+
+        Индекс строится один раз, копия группы (`clone`) получает его копию,
+        а set_assignment и set_assignments поддерживают его в актуальном виде.
+        """
+        if self._givers is None:
+            self._givers = {assignment.receiver_id: giver_id for giver_id, assignment in self.assignments.items()}
+        return self._givers.get(receiver_id)
+
+    def givers_with_delivery(self, status: str) -> List[int]:
+        """ID дарителей с указанным статусом доставки уведомления"""
+        return [giver_id for giver_id, assignment in self.assignments.items() if assignment.delivery == status]
+
+    def qr_code_paths(self) -> List[str]:
+        """Пути ко всем загруженным QR-кодам группы"""
+        return [qr_code.path for assignment in self.assignments.values() for qr_code in assignment.qr_codes]
@@ -0,0 +1,66 @@
+import asyncio
+import html
+import logging
+from typing import Dict, Tuple
+import database as db
+import keyboards as kb
+from config import WISHLIST_NOTIFY_DELAY
+from outbox import outbox
+
+logger = logging.getLogger(__name__)
+
+
+class WishlistNotifier:
+    """Уведомления дарителям об изменении списка пожеланий получателя.
+
+    Каждое изменение переносит отправку на `delay` секунд, поэтому серия
+    правок превращается в одно сообщение с окончательным текстом.
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        # (invite_code, receiver_id) -> таймер отправки
+        self._pending: Dict[Tuple[str, int], asyncio.TimerHandle] = {}
+
+    def schedule(self, invite_code: str, receiver_id: int):
+        """Планирование уведомления (предыдущее для этого получателя отменяется)"""
+        key = (invite_code, receiver_id)
+        timer = self._pending.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        loop = asyncio.get_running_loop()
+        self._pending[key] = loop.call_later(self.delay, self._notify, key)
+
+    def cancel_all(self):
+        """Отмена всех запланированных уведомлений"""
+        for timer in self._pending.values():
+            timer.cancel()
+        self._pending.clear()
+
+    def _notify(self, key: Tuple[str, int]):
+        self._pending.pop(key, None)
+        invite_code, receiver_id = key
+
+        group = db.get_group(invite_code)
+        if not group or not group.is_distributed:
+            return
+
+        giver_id = db.get_giver_id(invite_code, receiver_id)
+        if giver_id is None:
+            return
+
+        wishlist = db.get_wishlist(receiver_id, invite_code)
+        wishlist_text = f"🎁 <b>Новые пожелания:</b>\n{html.escape(wishlist)}" if wishlist else "Список пожеланий теперь пуст."
+
+        outbox.send_message(
+            giver_id,
+            f"🔔 <b>Ваш получатель в группе \"{html.escape(group.name)}\" обновил список пожеланий</b>\n\n"
+            f"{wishlist_text}",
+            reply_markup=kb.back_to_group(invite_code),
+            parse_mode="HTML"
+        )
+        logger.info("Уведомление об изменении пожеланий поставлено в очередь: группа %s", invite_code)
+
+
+wishlist_notifier = WishlistNotifier(delay=WISHLIST_NOTIFY_DELAY)
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from typing import Optional
+from aiogram import Bot
+from bot_session import bulk
+from config import OUTBOX_RATE
+from logs import get_context, set_context
+
+logger = logging.getLogger(__name__)
+
+
+class Outbox:
+    """Очередь исходящих уведомлений с ограничением скорости отправки"""
+
+    def __init__(self, rate: float):
+        self._interval = 1 / rate
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._bot: Optional[Bot] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, bot: Bot):
+        """Запуск фоновой отправки"""
+        self._bot = bot
+        self._task = asyncio.create_task(self._worker())
+
+    async def stop(self):
+        """Остановка фоновой отправки"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def send_message(self, chat_id: int, text: str, **kwargs):
+        """Постановка сообщения в очередь"""
+        # Контекст логов запроса, из которого пришло сообщение
+        self._queue.put_nowait((chat_id, text, kwargs, get_context()))
+
+    async def _worker(self):
+        # Уведомления уступают ответам пользователям; паузы после 429 выдерживает сессия
+        with bulk():
+            while True:
+                chat_id, text, kwargs, context = await self._queue.get()
+                set_context(context)
+                try:
+                    await self._send(chat_id, text, kwargs)
+                finally:
+                    self._queue.task_done()
+                await asyncio.sleep(self._interval)
+
+    async def _send(self, chat_id: int, text: str, kwargs: dict):
+        try:
+            await self._bot.send_message(chat_id=chat_id, text=text, **kwargs)
+        except Exception as e:
+            logger.warning("Не удалось отправить сообщение %s: %s", chat_id, e)
+
+
+outbox = Outbox(rate=OUTBOX_RATE)
@@ -0,0 +1,76 @@
+import time
+from collections import OrderedDict
+from html import escape
+from typing import List, Tuple
+from models import Group, Participant
+
+# Лимит длины текста сообщения в Telegram
+MESSAGE_LIMIT = 4096
+# Запас под заголовок страницы ("Участники группы (N)", "Страница X из Y")
+HEADER_RESERVE = 200
+# Максимум строк на странице, даже если они короткие
+MAX_PAGE_ITEMS = 50
+
+# Сколько секунд хранить страницы группы и максимум групп в кэше
+PAGES_CACHE_TTL = 3600
+PAGES_CACHE_SIZE = 1000
+
+# Кэш страниц: invite_code -> (версия списка участников, список страниц, время истечения)
+_pages_cache: "OrderedDict[str, Tuple[int, List[str], float]]" = OrderedDict()
+
+
+def format_participant(user_id: int, user_info: Participant, admin_id: int) -> str:
+    """Строка участника для списка"""
+    admin_mark = "👑 " if user_id == admin_id else ""
+    username = f"@{user_info.username}" if user_info.username else ""
+    return f"{admin_mark}{escape(user_info.first_name)} {username}"
+
+
+def split_pages(lines: List[str], limit: int = MESSAGE_LIMIT - HEADER_RESERVE) -> List[str]:
+    """Разбиение строк на страницы, каждая из которых укладывается в лимит"""
+    pages = []
+    current = []
+    current_len = 0
+
+    for line in lines:
+        line = line[:limit]
+        added_len = len(line) + (1 if current else 0)
+        if current and (current_len + added_len > limit or len(current) >= MAX_PAGE_ITEMS):
+            pages.append("\n".join(current))
+            current = []
+            current_len = 0
+            added_len = len(line)
+        current.append(line)
+        current_len += added_len
+
+    if current or not pages:
+        pages.append("\n".join(current))
+
+    return pages
+
+
+def get_participant_pages(invite_code: str, group: Group) -> List[str]:
+    """Страницы списка участников (пересчитываются только при изменении списка)"""
+    # Пожелания, переписка и доставка меняют версию группы, но не текст списка
+    version = group.roster_version
+    now = time.monotonic()
+    cached = _pages_cache.get(invite_code)
+    if cached and cached[0] == version and cached[2] >= now:
+        _pages_cache.move_to_end(invite_code)
+        return cached[1]
+
+    lines = [
+        format_participant(user_id, user_info, group.admin_id)
+        for user_id, user_info in group.participants.items()
+    ]
+    pages = split_pages(lines)
+    _pages_cache[invite_code] = (version, pages, now + PAGES_CACHE_TTL)
+    _pages_cache.move_to_end(invite_code)
+    while len(_pages_cache) > PAGES_CACHE_SIZE:
+        _pages_cache.popitem(last=False)
+    return pages
+
+
+def invalidate(invite_code: str):
+    """Удаление страниц группы из кэша"""
+    _pages_cache.pop(invite_code, None)
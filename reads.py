@@ -0,0 +1,45 @@
+from typing import Dict, Optional
+import database as db
+from models import Group
+from singleflight import SingleFlight
+
+
+class ReadCoalescer:
+    """Чтение групп для экранов, которые открывают сотни участников одновременно.
+
+    Группа из рабочей базы отдаётся сразу. Архивную группу нужно распаковать
+    с диска: одновременные запросы одной группы ждут одну распаковку, которая
+    идёт в отдельном потоке и не останавливает обработку других обновлений.
+    """
+
+    def __init__(self):
+        self._flights = SingleFlight()
+        # Чтения из памяти, загрузки с диска, запросы, дождавшиеся чужой загрузки, и ненайденные группы
+        self.hits = 0
+        self.loads = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    async def get_group(self, invite_code: str) -> Optional[Group]:
+        """Группа по коду; архивная возвращается в рабочую базу"""
+        group = db.peek_group(invite_code)
+        if group is not None:
+            self.hits += 1
+            return group
+
+        if not db.get_archive().contains(invite_code):
+            self.misses += 1
+            return None
+
+        group, shared = await self._flights.do(invite_code, lambda: db.restore_group_async(invite_code))
+        if shared:
+            self.coalesced += 1
+        else:
+            self.loads += 1
+        return group
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "loads": self.loads, "coalesced": self.coalesced, "misses": self.misses}
+
+
+reads = ReadCoalescer()
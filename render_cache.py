@@ -0,0 +1,75 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup
+
+# Сколько секунд помнить содержимое сообщения
+RENDER_CACHE_TTL = 3600
+# Максимум сообщений в кэше
+RENDER_CACHE_SIZE = 10000
+
+# (chat_id, message_id) -> (отпечаток содержимого, время истечения)
+_rendered: "OrderedDict[Tuple[int, int], Tuple[str, float]]" = OrderedDict()
+
+
+def fingerprint(text: str, reply_markup: Optional[InlineKeyboardMarkup], parse_mode: Optional[str]) -> str:
+    """Отпечаток текста, клавиатуры и режима разметки сообщения"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(text.encode())
+    digest.update(b"\0")
+    if reply_markup is not None:
+        digest.update(reply_markup.model_dump_json(exclude_none=True).encode())
+    digest.update(b"\0")
+    digest.update((parse_mode or "").encode())
+    return digest.hexdigest()
+
+
+def is_rendered(key: Tuple[int, int], content: str) -> bool:
+    """Проверка, что сообщение уже показывает это содержимое"""
+    cached = _rendered.get(key)
+    if cached is None:
+        return False
+
+    if cached[1] < time.monotonic():
+        del _rendered[key]
+        return False
+
+    return cached[0] == content
+
+
+def remember(key: Tuple[int, int], content: str):
+    """Сохранение отпечатка показанного содержимого"""
+    _rendered[key] = (content, time.monotonic() + RENDER_CACHE_TTL)
+    _rendered.move_to_end(key)
+    while len(_rendered) > RENDER_CACHE_SIZE:
+        _rendered.popitem(last=False)
+
+
+async def edit_message(
+    callback: CallbackQuery,
+    text: str,
+    reply_markup: Optional[InlineKeyboardMarkup] = None,
+    parse_mode: Optional[str] = "HTML"
+) -> bool:
+    """Редактирование сообщения с кнопкой без лишнего запроса к Bot API.
+
+    Если сообщение уже показывает тот же текст и клавиатуру, запрос не
+    отправляется. Возвращает True, если сообщение было изменено.
+    """
+    message = callback.message
+    key = (message.chat.id, message.message_id)
+    content = fingerprint(text, reply_markup, parse_mode)
+
+    if is_rendered(key, content):
+        return False
+
+    try:
+        await message.edit_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            raise
+
+    remember(key, content)
+    return True
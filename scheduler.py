@@ -0,0 +1,251 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from aiogram import Bot
+import database as db
+from config import SCHEDULER_FILE
+from logs import set_context
+import tracing
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Bot, Dict], Awaitable[None]]
+
+# Обработчики заданий по типу
+_job_handlers: Dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+    """Регистрация обработчика заданий типа `kind`"""
+    def decorator(func: JobHandler) -> JobHandler:
+        if kind in _job_handlers:
+            raise ValueError(f"Обработчик заданий {kind!r} уже зарегистрирован")
+        _job_handlers[kind] = func
+        return func
+
+    return decorator
+
+
+def job_id(kind: str, invite_code: str) -> str:
+    """ID задания: у группы не больше одного задания каждого типа"""
+    return f"{kind}:{invite_code}"
+
+
+class JobScheduler:
+    """Планировщик отложенных заданий с сохранением на диск.
+
+    Задания лежат в куче по времени запуска (добавление и извлечение за
+    O(log n)). Каждое изменение дописывается строкой в журнал, при запуске
+    журнал проигрывается заново и сжимается, поэтому после перезапуска
+    просроченные задания выполняются сразу.
+    """
+
+    def __init__(self, journal_path: str):
+        self.journal_path = journal_path
+        self._jobs: Dict[str, Dict] = {}
+        # (время запуска, порядковый номер, ID задания)
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._journal = None
+        self._journal_records = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._bot: Optional[Bot] = None
+        # Выполняющиеся задания по ID и задания, наступившие, пока предыдущий запуск с тем же ID не закончился
+        self._running: Dict[str, asyncio.Task] = {}
+        self._deferred: Dict[str, Dict] = {}
+
+    # Журнал
+    def load(self):
+        """Восстановление заданий из журнала и его сжатие"""
+        self._jobs.clear()
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Оборванная последняя строка после сбоя
+                        continue
+                    if record["op"] == "add":
+                        self._jobs[record["job"]["id"]] = record["job"]
+                    else:
+                        self._jobs.pop(record["id"], None)
+
+        self._heap = []
+        for job in self._jobs.values():
+            job["seq"] = next(self._seq)
+            self._heap.append((job["run_at"], job["seq"], job["id"]))
+        heapq.heapify(self._heap)
+
+        self._compact()
+
+    def _compact(self):
+        """Перезапись журнала только с активными заданиями"""
+        if self._journal is not None:
+            self._journal.close()
+
+        payload = "".join(
+            json.dumps({"op": "add", "job": self._public(job)}, ensure_ascii=False) + "\n"
+            for job in self._jobs.values()
+        )
+        db.write_atomic(self.journal_path, payload)
+        self._journal_records = len(self._jobs)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def _append(self, record: Dict):
+        self._journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._journal.flush()
+        self._journal_records += 1
+
+        # Журнал разросся из-за выполненных заданий — сжимаем
+        if self._journal_records > 1000 and self._journal_records > 2 * len(self._jobs):
+            self._compact()
+
+    @staticmethod
+    def _public(job: Dict) -> Dict:
+        return {key: value for key, value in job.items() if key != "seq"}
+
+    # Управление заданиями
+    def schedule(self, kind: str, invite_code: str, run_at: float, **payload) -> Dict:
+        """Планирование задания (заменяет задание того же типа для группы)"""
+        job = {
+            "id": job_id(kind, invite_code),
+            "kind": kind,
+            "invite_code": invite_code,
+            "run_at": run_at,
+            **payload
+        }
+        job["seq"] = next(self._seq)
+        self._jobs[job["id"]] = job
+        heapq.heappush(self._heap, (run_at, job["seq"], job["id"]))
+        self._append({"op": "add", "job": self._public(job)})
+
+        # Новое задание может оказаться раньше того, которого ждёт цикл
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    def cancel(self, kind: str, invite_code: str) -> bool:
+        """Отмена задания. Запись в куче удалится при извлечении"""
+        return self._remove(job_id(kind, invite_code))
+
+    def cancel_group(self, invite_code: str):
+        """Отмена всех заданий группы"""
+        for kind in list(_job_handlers):
+            self.cancel(kind, invite_code)
+
+    def get(self, kind: str, invite_code: str) -> Optional[Dict]:
+        """Запланированное задание группы"""
+        return self._jobs.get(job_id(kind, invite_code))
+
+    def _remove(self, id_: str) -> bool:
+        if self._jobs.pop(id_, None) is None:
+            return False
+        self._append({"op": "remove", "id": id_})
+        return True
+
+    # Выполнение
+    def start(self, bot: Bot):
+        """Загрузка заданий и запуск фонового цикла"""
+        self._bot = bot
+        self._wakeup = asyncio.Event()
+        self.load()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановка фонового цикла и выполняющихся заданий (они останутся в журнале)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        running = list(self._running.values())
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        self._running.clear()
+        self._deferred.clear()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _pop_due(self, now: float) -> Optional[Dict]:
+        """Извлечение первого наступившего задания, пропуская отменённые записи"""
+        while self._heap:
+            run_at, seq, id_ = self._heap[0]
+            job = self._jobs.get(id_)
+            if job is None or job["seq"] != seq:
+                heapq.heappop(self._heap)
+                continue
+            if run_at > now:
+                return None
+            heapq.heappop(self._heap)
+            return job
+        return None
+
+    def _next_delay(self, now: float) -> Optional[float]:
+        return max(0.0, self._heap[0][0] - now) if self._heap else None
+
+    async def _run(self):
+        while True:
+            job = self._pop_due(time.time())
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self._next_delay(time.time()))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            if job["id"] in self._running:
+                # Предыдущий запуск ещё идёт (например, долгая рассылка) — запустим после него
+                self._deferred[job["id"]] = job
+                continue
+
+            # Каждое задание в своей задаче: долгая рассылка не задерживает остальные
+            task = asyncio.create_task(self._execute(job))
+            self._running[job["id"]] = task
+            task.add_done_callback(lambda _, id_=job["id"]: self._finished(id_))
+
+    def _finished(self, id_: str):
+        self._running.pop(id_, None)
+        job = self._deferred.pop(id_, None)
+        current = self._jobs.get(id_)
+        if job is not None and current is not None and current["seq"] == job["seq"]:
+            heapq.heappush(self._heap, (job["run_at"], job["seq"], id_))
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    async def _execute(self, job: Dict):
+        handler = _job_handlers.get(job["kind"])
+        set_context({"handler": f"job:{job['kind']}", "invite_code": job["invite_code"] or None})
+        try:
+            if handler is None:
+                logger.error("Неизвестный тип задания: %s", job["kind"])
+            elif tracing.should_sample():
+                with tracing.trace(f"job:{job['kind']}") as root:
+                    root.tag("invite_code", job["invite_code"] or None)
+                    await handler(self._bot, self._public(job))
+            else:
+                await handler(self._bot, self._public(job))
+        except asyncio.CancelledError:
+            # Остановка бота: задание остаётся в журнале и продолжится после перезапуска
+            raise
+        except Exception as e:
+            logger.exception("Ошибка при выполнении задания %s: %s", job["id"], e)
+
+        # Задание могли перепланировать, пока оно выполнялось
+        current = self._jobs.get(job["id"])
+        if current is not None and current["seq"] == job["seq"]:
+            self._remove(job["id"])
+
+
+scheduler = JobScheduler(SCHEDULER_FILE)
@@ -0,0 +1,44 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """Одно выполнение на ключ: одновременные повторы ждут результат первого.
+
+    Если по ключу уже выполняется работа, повторный вызов не запускает её
+    заново, а получает тот же результат (или то же исключение). После
+    завершения ключ освобождается.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.shared_count = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Выполнение `func` или ожидание уже идущего выполнения. Возвращает (результат, был ли он общим)"""
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.shared_count += 1
+            # Отмена ожидающего повтора не должна отменять первое выполнение
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение уже передано вызывающему; повторы его тоже получат
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._in_flight[key]
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._in_flight
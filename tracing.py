@@ -0,0 +1,185 @@
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+SERVICE_NAME = "santa-bot"
+
+
+class Span:
+    """Отрезок работы внутри трассы (формат Zipkin v2)"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "timestamp", "started", "duration", "tags")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str]):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        # Время начала в микросекундах эпохи и точный счётчик для длительности
+        self.timestamp = time.time_ns() // 1000
+        self.started = time.perf_counter()
+        self.duration = 0
+        self.tags: Dict[str, str] = {}
+
+    def tag(self, key: str, value):
+        if value is not None:
+            self.tags[key] = str(value)
+
+    def to_dict(self) -> Dict:
+        span = {
+            "traceId": self.trace_id,
+            "id": self.span_id,
+            "name": self.name,
+            "timestamp": self.timestamp,
+            "duration": self.duration,
+            "localEndpoint": {"serviceName": SERVICE_NAME},
+            "tags": self.tags
+        }
+        if self.parent_id:
+            span["parentId"] = self.parent_id
+        return span
+
+
+class SpanExporter:
+    """Запись завершённых отрезков в файл фоновым потоком, по одному JSON на строку"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.SimpleQueue[Optional[Span]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def export(self, span: Span):
+        self._queue.put(span)
+
+    def _run(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                span = self._queue.get()
+                if span is None:
+                    break
+                f.write(json.dumps(span.to_dict(), ensure_ascii=False) + "\n")
+                # Пишем пачкой всё, что накопилось, и сбрасываем буфер, когда очередь пуста
+                if self._queue.empty():
+                    f.flush()
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_exporter: Optional[SpanExporter] = None
+_sample_rate = 0.0
+
+
+def configure(sample_rate: float, path: str):
+    """Включение трассировки для доли `sample_rate` обновлений"""
+    global _exporter, _sample_rate
+    stop()
+    _sample_rate = sample_rate
+    if sample_rate > 0:
+        _exporter = SpanExporter(path)
+        _exporter.start()
+
+
+def stop():
+    """Запись оставшихся отрезков и остановка экспорта"""
+    global _exporter, _sample_rate
+    if _exporter is not None:
+        _exporter.stop()
+        _exporter = None
+    _sample_rate = 0.0
+
+
+def current_span() -> Optional[Span]:
+    """Текущий отрезок или None, если обновление не попало в выборку"""
+    return _current.get()
+
+
+def _finish(span: Span):
+    span.duration = max(1, int((time.perf_counter() - span.started) * 1_000_000))
+    if _exporter is not None:
+        _exporter.export(span)
+
+
+def should_sample() -> bool:
+    """Решение, трассировать ли очередное обновление или задание"""
+    return _exporter is not None and random.random() < _sample_rate
+
+
+@contextmanager
+def trace(name: str) -> Iterator[Span]:
+    """Корневой отрезок новой трассы. Вызывающий сначала проверяет `should_sample`"""
+    root = Span(name, f"{random.getrandbits(128):032x}", None)
+    token = _current.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.tag("error", type(e).__name__)
+        raise
+    finally:
+        _current.reset(token)
+        _finish(root)
+
+
+@contextmanager
+def span(name: str, **tags) -> Iterator[Optional[Span]]:
+    """Дочерний отрезок текущей трассы (ничего не делает вне трассы)"""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(name, parent.trace_id, parent.span_id)
+    for key, value in tags.items():
+        child.tag(key, value)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.tag("error", type(e).__name__)
+        raise
+    finally:
+        _current.reset(token)
+        _finish(child)
+
+
+def traced(name: str):
+    """Декоратор: вызов функции оборачивается в дочерний отрезок"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current.get() is None:
+                    return await func(*args, **kwargs)
+                with span(name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator